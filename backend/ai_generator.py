@@ -1,335 +1,544 @@
-import anthropic
-from typing import List, Optional, Dict, Any
-
-class AIGenerator:
-    """Handles interactions with Anthropic's Claude API for generating responses"""
-    
-    # Static system prompt to avoid rebuilding on each call
-    SYSTEM_PROMPT = """ You are an AI assistant specialized in course materials and educational content with access to tools for course information.
-
-Available Tools:
-1. **get_course_outline**: Use for questions about course structure, outline, or what lessons/topics are covered in a course
-   - Returns: Course title, course link, instructor, and complete list of lessons with their numbers and titles
-   - Use when asked about: "What is the outline?", "What lessons are in X?", "What topics are covered?", "Course structure"
-
-2. **search_course_content**: Use for questions about specific course content or detailed educational materials
-   - Returns: Relevant content chunks from course materials
-   - Use when asked about: Specific concepts, detailed explanations, lesson content, what is taught in a particular lesson
-
-Tool Usage Guidelines:
-- **Up to two sequential tool calls are supported** - You can call tools twice per query if needed
-- **Each tool call is a separate step**: After your first tool call, you'll receive the results. You can then decide if a second search is needed
-- **Reasoning between calls**: Use the results from the first search to refine your second search query if needed
-- **Use sequentially, not in parallel**: Make one tool call at a time; after receiving results, make another if needed
-- **Combine results**: Synthesize results from both rounds (if used) into a cohesive answer
-- **Stop when you have enough information**: Don't call tools if you already have sufficient information from the first call
-- Choose the most appropriate tool based on the question type
-- Synthesize tool results into accurate, fact-based responses
-- If a tool yields no results, state this clearly without offering alternatives
-
-Response Protocol:
-- **General knowledge questions**: Answer using existing knowledge without using tools
-- **Course outline/structure questions**: Use get_course_outline tool first, then answer
-- **Course content questions**: Use search_course_content tool first, then answer
-- **Multi-part questions**: Use first search for initial information, second search for details if needed
-- **No meta-commentary**:
- - Provide direct answers only — no reasoning process, tool explanations, or question-type analysis
- - Do not mention "based on the search results" or "using the outline tool"
-
-
-All responses must be:
-1. **Brief, Concise and focused** - Get to the point quickly
-2. **Educational** - Maintain instructional value
-3. **Clear** - Use accessible language
-4. **Example-supported** - Include relevant examples when they aid understanding
-Provide only the direct answer to what was asked.
-"""
-    
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
-        self.model = model
-        
-        # Pre-build base API parameters
-        self.base_params = {
-            "model": self.model,
-            "temperature": 0,
-            "max_tokens": 800
-        }
-    
-    def generate_response(self, query: str,
-                         conversation_history: Optional[str] = None,
-                         tools: Optional[List] = None,
-                         tool_manager=None,
-                         max_tool_rounds: int = 2) -> str:
-        """
-        Generate AI response with up to 2 sequential tool calling rounds.
-
-        Args:
-            query: The user's question or request
-            conversation_history: Previous messages for context
-            tools: Available tools the AI can use
-            tool_manager: Manager to execute tools
-            max_tool_rounds: Maximum number of sequential tool rounds (default: 2)
-
-        Returns:
-            Generated response as string
-        """
-
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
-        )
-
-        # Prepare initial API call parameters
-        api_params = {
-            **self.base_params,
-            "messages": [{"role": "user", "content": query}],
-            "system": system_content
-        }
-
-        # Add tools if available
-        if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
-
-        # Execute with tool loop (supports up to max_tool_rounds)
-        if tools and tool_manager:
-            return self._execute_with_tool_loop(api_params, tool_manager, max_tool_rounds)
-
-        # No tools available - make single API call
-        response = self.client.messages.create(**api_params)
-        return self._extract_response_text(response)
-
-    def _execute_with_tool_loop(self, api_params: Dict[str, Any], tool_manager, max_rounds: int) -> str:
-        """
-        Execute query with iterative tool calling up to max_rounds times.
-
-        Args:
-            api_params: Initial API parameters with messages, system, tools
-            tool_manager: Manager to execute tools
-            max_rounds: Maximum number of tool rounds (default: 2)
-
-        Returns:
-            Final response text after all rounds complete or termination condition met
-        """
-        messages = api_params["messages"].copy()
-        round_count = 0
-
-        while round_count < max_rounds:
-            # Prepare params for this round
-            current_params = {
-                **api_params,
-                "messages": messages
-            }
-
-            # API call for this round
-            response = self.client.messages.create(**current_params)
-            round_count += 1
-
-            # Check if Claude wants to use tools
-            if response.stop_reason != "tool_use":
-                # No tool use - return response directly
-                return self._extract_response_text(response)
-
-            # Execute tools for this round
-            tool_results = self._execute_tools_from_response(response, tool_manager)
-
-            if not tool_results:
-                # Tool execution failed or no tools found
-                return self._extract_response_text(response)
-
-            # Build message history for next round
-            messages = self._build_message_for_next_round(messages, response, tool_results)
-
-            # If we've hit max rounds after this tool execution, make final call
-            if round_count >= max_rounds:
-                final_params = {
-                    **self.base_params,
-                    "messages": messages,
-                    "system": api_params["system"]
-                }
-                final_response = self.client.messages.create(**final_params)
-                return self._extract_response_text(final_response)
-
-        # This shouldn't be reached, but return empty string as fallback
-        return ""
-
-    def _should_continue_tool_loop(self, response, round_count: int, max_rounds: int) -> bool:
-        """
-        Determine if tool loop should continue to next round.
-
-        Args:
-            response: API response from current round
-            round_count: Current round number (1-indexed)
-            max_rounds: Maximum rounds allowed
-
-        Returns:
-            True if loop should continue, False to terminate
-        """
-        # Check if we've hit max rounds
-        if round_count >= max_rounds:
-            return False
-
-        # Check if Claude requested tool use
-        if response.stop_reason != "tool_use":
-            return False
-
-        # Check if response has tool_use blocks
-        has_tool_use = any(
-            hasattr(block, 'type') and block.type == "tool_use"
-            for block in response.content
-        )
-
-        return has_tool_use
-
-    def _execute_tools_from_response(self, response, tool_manager) -> List[Dict]:
-        """
-        Execute all tool calls from response.
-
-        Args:
-            response: API response containing tool use requests
-            tool_manager: Manager to execute tools
-
-        Returns:
-            List of tool_result dicts, or empty list if error/no tools
-        """
-        tool_results = []
-
-        for content_block in response.content:
-            if not hasattr(content_block, 'type'):
-                continue
-
-            if content_block.type != "tool_use":
-                continue
-
-            try:
-                # Execute the tool
-                tool_result = tool_manager.execute_tool(
-                    content_block.name,
-                    **content_block.input
-                )
-
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": content_block.id,
-                    "content": tool_result
-                })
-
-            except Exception as e:
-                # Log error and return empty (signals termination)
-                import logging
-                logging.getLogger(__name__).error(
-                    f"Failed to execute tool '{content_block.name}': {str(e)}",
-                    exc_info=True
-                )
-                return []
-
-        return tool_results
-
-    def _build_message_for_next_round(self, current_messages: List[Dict],
-                                      assistant_response,
-                                      tool_results: List[Dict]) -> List[Dict]:
-        """
-        Build message history for the next round.
-
-        Args:
-            current_messages: Messages from before this round
-            assistant_response: The assistant's response with tool use
-            tool_results: Executed tool results
-
-        Returns:
-            New messages list for next API call
-        """
-        new_messages = current_messages.copy()
-
-        # Add assistant's tool use decision
-        new_messages.append({
-            "role": "assistant",
-            "content": assistant_response.content
-        })
-
-        # Add tool results as user message
-        if tool_results:
-            new_messages.append({
-                "role": "user",
-                "content": tool_results
-            })
-
-        return new_messages
-
-    def _extract_response_text(self, response) -> str:
-        """
-        Safely extract text from response.
-
-        Args:
-            response: API response object
-
-        Returns:
-            Extracted text or empty string if not found
-        """
-        try:
-            for content_block in response.content:
-                if hasattr(content_block, 'text'):
-                    return content_block.text
-
-            # Fallback: try first content block
-            if hasattr(response.content[0], 'text'):
-                return response.content[0].text
-
-            return ""
-
-        except (IndexError, AttributeError):
-            return ""
-
-    def _handle_tool_execution(self, initial_response, base_params: Dict[str, Any], tool_manager):
-        """
-        DEPRECATED: Handle execution of tool calls and get follow-up response.
-
-        This method is kept for backward compatibility but is no longer used.
-        Use _execute_with_tool_loop() instead for multi-round tool calling support.
-
-        Args:
-            initial_response: The response containing tool use requests
-            base_params: Base API parameters
-            tool_manager: Manager to execute tools
-
-        Returns:
-            Final response text after tool execution
-        """
-        # Start with existing messages
-        messages = base_params["messages"].copy()
-        
-        # Add AI's tool use response
-        messages.append({"role": "assistant", "content": initial_response.content})
-        
-        # Execute all tool calls and collect results
-        tool_results = []
-        for content_block in initial_response.content:
-            if content_block.type == "tool_use":
-                tool_result = tool_manager.execute_tool(
-                    content_block.name, 
-                    **content_block.input
-                )
-                
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": content_block.id,
-                    "content": tool_result
-                })
-        
-        # Add tool results as single message
-        if tool_results:
-            messages.append({"role": "user", "content": tool_results})
-        
-        # Prepare final API call without tools
-        final_params = {
-            **self.base_params,
-            "messages": messages,
-            "system": base_params["system"]
-        }
-        
-        # Get final response
-        final_response = self.client.messages.create(**final_params)
-        return final_response.content[0].text
\ No newline at end of file
+import asyncio
+import copy
+import logging
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, AsyncIterator
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# One "User: ..." / "Assistant: ..." message, running until the next speaker line
+_HISTORY_RE = re.compile(r'(?ms)^(User|Assistant):\s*(.*?)(?=^(?:User|Assistant):|\Z)')
+
+# Stands in for an empty past turn; the API rejects empty message content
+_EMPTY_TURN = "(empty message)"
+
+
+def create_http_client() -> "httpx.AsyncClient":
+    """
+    Build a pooled HTTP/2 client for Anthropic API calls.
+
+    Concurrent queries multiplex over its kept-alive connections instead of
+    opening their own. The connections belong to the event loop that first
+    uses them, so each loop needs its own client: the server creates one at
+    startup, and scripts create theirs inside asyncio.run.
+    """
+    # Imported on first use, like the SDK, so importing this module stays cheap
+    import httpx
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+
+
+@lru_cache(maxsize=None)
+def _anthropic_module():
+    """Import the anthropic SDK on first use rather than at module import"""
+    import anthropic
+    return anthropic
+
+
+class AIGenerator:
+    """Handles interactions with Anthropic's Claude API for generating responses"""
+    
+    # Static system prompt to avoid rebuilding on each call
+    SYSTEM_PROMPT = """ You are an AI assistant specialized in course materials and educational content with access to tools for course information.
+
+Available Tools:
+1. **get_course_outline**: Use for questions about course structure, outline, or what lessons/topics are covered in a course
+   - Returns: Course title, course link, instructor, and complete list of lessons with their numbers and titles
+   - Use when asked about: "What is the outline?", "What lessons are in X?", "What topics are covered?", "Course structure"
+
+2. **search_course_content**: Use for questions about specific course content or detailed educational materials
+   - Returns: Relevant content chunks from course materials
+   - Use when asked about: Specific concepts, detailed explanations, lesson content, what is taught in a particular lesson
+
+Tool Usage Guidelines:
+- **Up to two sequential tool calls are supported** - You can call tools twice per query if needed
+- **Each tool call is a separate step**: After your first tool call, you'll receive the results. You can then decide if a second search is needed
+- **Reasoning between calls**: Use the results from the first search to refine your second search query if needed
+- **Use sequentially, not in parallel**: Make one tool call at a time; after receiving results, make another if needed
+- **Combine results**: Synthesize results from both rounds (if used) into a cohesive answer
+- **Stop when you have enough information**: Don't call tools if you already have sufficient information from the first call
+- Choose the most appropriate tool based on the question type
+- Synthesize tool results into accurate, fact-based responses
+- If a tool yields no results, state this clearly without offering alternatives
+
+Response Protocol:
+- **General knowledge questions**: Answer using existing knowledge without using tools
+- **Course outline/structure questions**: Use get_course_outline tool first, then answer
+- **Course content questions**: Use search_course_content tool first, then answer
+- **Multi-part questions**: Use first search for initial information, second search for details if needed
+- **No meta-commentary**:
+ - Provide direct answers only — no reasoning process, tool explanations, or question-type analysis
+ - Do not mention "based on the search results" or "using the outline tool"
+
+
+All responses must be:
+1. **Brief, Concise and focused** - Get to the point quickly
+2. **Educational** - Maintain instructional value
+3. **Clear** - Use accessible language
+4. **Example-supported** - Include relevant examples when they aid understanding
+Provide only the direct answer to what was asked.
+"""
+    
+    # Marks a prompt prefix as cacheable so repeat calls skip prefill
+    CACHE_CONTROL = {"type": "ephemeral"}
+
+    def __init__(self, api_key: str, model: str, http_client: Optional["httpx.AsyncClient"] = None):
+        # Without an http_client the SDK builds its own default one
+        self.client = _anthropic_module().AsyncAnthropic(api_key=api_key, http_client=http_client)
+        self.model = model
+        
+        # Pre-build base API parameters
+        self.base_params = {
+            "model": self.model,
+            "temperature": 0,
+            "max_tokens": 800
+        }
+
+        # Pre-build the cached system block and tool choices shared by every call
+        self._system_block = [
+            {"type": "text", "text": self.SYSTEM_PROMPT, "cache_control": self.CACHE_CONTROL}
+        ]
+        self._tool_choice_auto = {"type": "auto"}
+        self._tool_choice_none = {"type": "none"}
+
+    def use_http_client(self, http_client: "httpx.AsyncClient"):
+        """
+        Send API calls through the given HTTP client, e.g. the server's pooled one.
+
+        The caller owns the client and closes it when its event loop shuts down.
+        """
+        self.client = self.client.with_options(http_client=http_client)
+    
+    def generate_response_sync(self, query: str,
+                               conversation_history: Optional[str] = None,
+                               tools: Optional[List] = None,
+                               tool_manager=None,
+                               max_tool_rounds: int = 2) -> str:
+        """
+        Synchronous wrapper around generate_response for non-async callers.
+
+        Must not be called from inside a running event loop; await
+        generate_response there instead. Each call runs on a new event loop
+        with its own short-lived HTTP client, so this is meant for scripts
+        rather than the server.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            max_tool_rounds: Maximum number of sequential tool rounds (default: 2)
+
+        Returns:
+            Generated response as string
+        """
+        async def run() -> str:
+            # Connections must not outlive the loop, so this call's copy of the
+            # generator gets a client that is closed before asyncio.run returns
+            async with create_http_client() as http_client:
+                generator = copy.copy(self)
+                generator.use_http_client(http_client)
+                return await generator.generate_response(
+                    query,
+                    conversation_history=conversation_history,
+                    tools=tools,
+                    tool_manager=tool_manager,
+                    max_tool_rounds=max_tool_rounds
+                )
+
+        return asyncio.run(run())
+
+    async def generate_response(self, query: str,
+                                conversation_history: Optional[str] = None,
+                                tools: Optional[List] = None,
+                                tool_manager=None,
+                                max_tool_rounds: int = 2) -> str:
+        """
+        Generate AI response with up to 2 sequential tool calling rounds.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            max_tool_rounds: Maximum number of sequential tool rounds (default: 2)
+
+        Returns:
+            Generated response as string
+        """
+
+        api_params = self._build_api_params(query, conversation_history, tools)
+
+        # Execute with tool loop (supports up to max_tool_rounds)
+        if tools and tool_manager:
+            return await self._execute_with_tool_loop(api_params, tool_manager, max_tool_rounds)
+
+        # No tools available - make single API call
+        response = await self.client.messages.create(**api_params)
+        return self._extract_response_text(response)
+
+    async def generate_response_stream(self, query: str,
+                                       conversation_history: Optional[str] = None,
+                                       tools: Optional[List] = None,
+                                       tool_manager=None,
+                                       max_tool_rounds: int = 2) -> AsyncIterator[Dict[str, str]]:
+        """
+        Stream AI response text as it is generated, with the same tool rounds
+        as generate_response.
+
+        Text deltas are yielded as soon as they arrive. When a round ends in
+        tool use, the tools are executed, a tool_round_end event is yielded
+        and the next round is streamed. Text from a round that ends in tool
+        use (e.g. a "Let me search..." preamble) was written before the tool
+        results existed, so callers should not keep it as the answer.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            max_tool_rounds: Maximum number of sequential tool rounds (default: 2)
+
+        Yields:
+            {"type": "text", "text": ...} events in generation order, and a
+            {"type": "tool_round_end"} event after each tool round
+        """
+        api_params = self._build_api_params(query, conversation_history, tools)
+        messages = api_params["messages"]
+        round_count = 0
+
+        while True:
+            async with self.client.messages.stream(**api_params) as stream:
+                async for text in stream.text_stream:
+                    yield {"type": "text", "text": text}
+                # The SDK assembles tool_use input from the streamed JSON deltas
+                response = await stream.get_final_message()
+
+            if response.stop_reason != "tool_use" or not tool_manager or round_count >= max_tool_rounds:
+                return
+
+            tool_results = await self._execute_tools_async(response, tool_manager)
+            if not tool_results:
+                return
+
+            self._build_message_for_next_round(messages, response, tool_results)
+            round_count += 1
+            yield {"type": "tool_round_end"}
+
+            if round_count >= max_tool_rounds:
+                # Final round answers from gathered results, no further tool calls
+                self._disable_tool_use(api_params)
+
+    async def generate_responses_batch(self, queries: List[str],
+                                       tools: Optional[List] = None,
+                                       tool_manager=None,
+                                       poll_interval: float = 5.0) -> List[str]:
+        """
+        Answer several independent queries in one Message Batches request.
+
+        Batches cannot run tool loops between turns, so when tools are in use
+        the queries fall back to concurrent generate_response calls.
+
+        Scripts calling this under asyncio.run should build the generator
+        (and any http_client passed to it) inside that same loop.
+
+        Args:
+            queries: Independent questions to answer
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            poll_interval: Seconds between batch status checks
+
+        Returns:
+            Response text per query, in the same order ("" for failed entries)
+        """
+        if not queries:
+            return []
+
+        if tools and tool_manager:
+            return list(await asyncio.gather(*(
+                self.generate_response(query, tools=tools, tool_manager=tool_manager)
+                for query in queries
+            )))
+
+        batch = await self.client.messages.batches.create(requests=[
+            {"custom_id": f"query-{index}", "params": self._build_api_params(query, None, None)}
+            for index, query in enumerate(queries)
+        ])
+
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.messages.batches.retrieve(batch.id)
+
+        responses = [""] * len(queries)
+        async for entry in await self.client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                index = int(entry.custom_id.rpartition("-")[2])
+                responses[index] = self._extract_response_text(entry.result.message)
+
+        return responses
+
+    def _build_api_params(self, query: str,
+                          conversation_history: Optional[str],
+                          tools: Optional[List]) -> Dict[str, Any]:
+        """
+        Build the initial API parameters for a query.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+
+        Returns:
+            Parameters for messages.create / messages.stream
+        """
+        # Static prompt is sent as a cached block and stays byte-identical
+        # across calls; history goes into messages so it never breaks the cache
+        messages = self._history_to_messages(conversation_history)
+        messages.append({"role": "user", "content": query})
+
+        api_params = {
+            **self.base_params,
+            "messages": messages,
+            "system": self._system_block
+        }
+
+        # Add tools if available
+        if tools:
+            api_params["tools"] = self._with_cached_tools(tools)
+            api_params["tool_choice"] = self._tool_choice_auto
+
+        return api_params
+
+    def _disable_tool_use(self, api_params: Dict[str, Any]):
+        """
+        Stop the model from calling tools on the final, synthesis-only call.
+
+        The tool definitions stay in place: they are the first part of the
+        cached prefix (removing them would also miss the cached system
+        prompt), and the API expects them whenever messages carry
+        tool_use/tool_result blocks. tool_choice "none" forces a text answer.
+
+        Args:
+            api_params: Per-query API parameters, updated in place
+        """
+        if "tools" in api_params:
+            api_params["tool_choice"] = self._tool_choice_none
+
+    def _history_to_messages(self, history: Optional[str]) -> List[Dict[str, str]]:
+        """
+        Convert formatted conversation history into API message dicts.
+
+        Args:
+            history: History in SessionManager's "User: ..." / "Assistant: ..." format
+
+        Returns:
+            List of role/content message dicts, empty if there is no history.
+            Empty turns (an empty query or answer) get placeholder content so
+            roles keep alternating.
+        """
+        if not history:
+            return []
+
+        return [
+            {"role": match.group(1).lower(), "content": match.group(2).strip() or _EMPTY_TURN}
+            for match in _HISTORY_RE.finditer(history)
+        ]
+
+    def _with_cached_tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Mark the last tool definition as a cache breakpoint.
+
+        The caller's tool dicts are left untouched; only the last one is copied.
+
+        Args:
+            tools: Tool definitions for the API call
+
+        Returns:
+            Tool definitions with cache_control set on the final entry
+        """
+        return [*tools[:-1], {**tools[-1], "cache_control": self.CACHE_CONTROL}]
+
+    async def _execute_with_tool_loop(self, api_params: Dict[str, Any], tool_manager, max_rounds: int) -> str:
+        """
+        Execute query with iterative tool calling up to max_rounds times.
+
+        Args:
+            api_params: Initial API parameters with messages, system, tools
+            tool_manager: Manager to execute tools
+            max_rounds: Maximum number of tool rounds (default: 2)
+
+        Returns:
+            Final response text after all rounds complete or termination condition met
+        """
+        # Params and messages are built fresh per query, so both are
+        # updated in place across rounds
+        current_params = api_params
+        messages = current_params["messages"]
+        round_count = 0
+
+        while round_count < max_rounds:
+            # API call for this round
+            response = await self.client.messages.create(**current_params)
+            round_count += 1
+
+            # Check if Claude wants to use tools
+            if response.stop_reason != "tool_use":
+                # No tool use - return response directly
+                return self._extract_response_text(response)
+
+            # Execute tools for this round
+            tool_results = await self._execute_tools_async(response, tool_manager)
+
+            if not tool_results:
+                # Tool execution failed or no tools found
+                return self._extract_response_text(response)
+
+            # Build message history for next round
+            self._build_message_for_next_round(messages, response, tool_results)
+
+            # If we've hit max rounds after this tool execution, make final call.
+            # Any text beside tool_use blocks is a preamble written before the
+            # results existed, so it cannot stand in for this synthesis call.
+            if round_count >= max_rounds:
+                self._disable_tool_use(current_params)
+                final_response = await self.client.messages.create(**current_params)
+                return self._extract_response_text(final_response)
+
+        # This shouldn't be reached, but return empty string as fallback
+        return ""
+
+    async def _execute_tools_async(self, response, tool_manager) -> List[Dict]:
+        """
+        Execute all tool calls from response, running different tools concurrently.
+
+        Tools are synchronous, so calls run in worker threads and are awaited
+        together; results keep the order of the tool_use blocks. Blocks for
+        the same tool share one tool instance (and its last_sources), so they
+        run one after another in block order, as they would sequentially.
+
+        Args:
+            response: API response containing tool use requests
+            tool_manager: Manager to execute tools
+
+        Returns:
+            List of tool_result dicts, or empty list if error/no tools
+        """
+        tool_blocks = [
+            content_block for content_block in response.content
+            if getattr(content_block, 'type', None) == "tool_use"
+        ]
+
+        # Block indices per tool name, in block order
+        groups: Dict[str, List[int]] = {}
+        for i, block in enumerate(tool_blocks):
+            groups.setdefault(block.name, []).append(i)
+
+        def run_group(indices: List[int]) -> List[Any]:
+            """Run one tool's calls in order, stopping at the first failure"""
+            outcomes = []
+            for i in indices:
+                block = tool_blocks[i]
+                try:
+                    outcomes.append(tool_manager.execute_tool(block.name, **block.input))
+                except Exception as e:
+                    outcomes.append(e)
+                    break
+            return outcomes
+
+        group_outcomes = await asyncio.gather(
+            *(asyncio.to_thread(run_group, indices) for indices in groups.values())
+        )
+
+        # Calls skipped after a failure stay None; the failure comes first in
+        # block order, so the loop below stops before reaching them
+        results: List[Any] = [None] * len(tool_blocks)
+        for indices, outcomes in zip(groups.values(), group_outcomes):
+            for i, outcome in zip(indices, outcomes):
+                results[i] = outcome
+
+        # One slot per tool_use block, filled by index so order never depends
+        # on completion order
+        tool_results: List[Optional[Dict]] = [None] * len(tool_blocks)
+        for i, (content_block, tool_result) in enumerate(zip(tool_blocks, results)):
+            if isinstance(tool_result, Exception):
+                # Log error and return empty (signals termination)
+                logger.error(
+                    f"Failed to execute tool '{content_block.name}': {str(tool_result)}",
+                    exc_info=tool_result
+                )
+                return []
+
+            tool_results[i] = {
+                "type": "tool_result",
+                "tool_use_id": content_block.id,
+                "content": tool_result
+            }
+
+        return tool_results
+
+    def _build_message_for_next_round(self, current_messages: List[Dict],
+                                      assistant_response,
+                                      tool_results: List[Dict]) -> List[Dict]:
+        """
+        Extend message history for the next round.
+
+        Messages only grow within a query, so the list is appended to in
+        place rather than copied each round.
+
+        Args:
+            current_messages: Messages from before this round (mutated)
+            assistant_response: The assistant's response with tool use
+            tool_results: Executed tool results
+
+        Returns:
+            The same messages list, extended for the next API call
+        """
+        # Add assistant's tool use decision
+        current_messages.append({
+            "role": "assistant",
+            "content": assistant_response.content
+        })
+
+        # Add tool results as user message
+        if tool_results:
+            current_messages.append({
+                "role": "user",
+                "content": tool_results
+            })
+
+        return current_messages
+
+    def _extract_response_text(self, response) -> str:
+        """
+        Safely extract text from response.
+
+        Args:
+            response: API response object
+
+        Returns:
+            Extracted text or empty string if not found
+        """
+        try:
+            content = response.content
+
+            # Common case: pure-text responses carry the text in the first block
+            text = getattr(content[0], 'text', None)
+            if text is not None:
+                return text
+
+            for content_block in content:
+                text = getattr(content_block, 'text', None)
+                if text is not None:
+                    return text
+
+            return ""
+
+        except (IndexError, AttributeError, TypeError):
+            return ""
@@ -5,15 +5,19 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 
-from config import config
+import orjson
+
+from config import get_config
 from rag_system import RAGSystem
+from ai_generator import create_http_client
 
 # Initialize FastAPI app
-app = FastAPI(title="Course Materials RAG System", root_path="")
+app = FastAPI(title="Course Materials RAG System", root_path="", default_response_class=ORJSONResponse)
 
 # Add trusted host middleware for proxy
 app.add_middleware(
@@ -32,7 +36,7 @@ app.add_middleware(
 )
 
 # Initialize RAG system
-rag_system = RAGSystem(config)
+rag_system = RAGSystem(get_config())
 
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
@@ -63,7 +67,7 @@ async def query_documents(request: QueryRequest):
             session_id = rag_system.session_manager.create_session()
         
         # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
+        answer, sources = await rag_system.query(request.query, session_id)
         
         return QueryResponse(
             answer=answer,
@@ -73,6 +77,28 @@ async def query_documents(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """Process a query and stream the response as server-sent events"""
+    try:
+        session_id = request.session_id
+        if not session_id:
+            session_id = rag_system.session_manager.create_session()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        try:
+            async for event in rag_system.query_stream(request.query, session_id):
+                if event["type"] == "done":
+                    event = {**event, "session_id": session_id}
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            yield b"data: " + orjson.dumps({"type": "error", "detail": str(e)}) + b"\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -87,7 +113,11 @@ async def get_course_stats():
 
 @app.on_event("startup")
 async def startup_event():
-    """Load initial documents on startup"""
+    """Open pooled connections to the Anthropic API and load initial documents on startup"""
+    # Created here so its connections belong to the server's event loop
+    app.state.http_client = create_http_client()
+    rag_system.ai_generator.use_http_client(app.state.http_client)
+
     docs_path = "../docs"
     if os.path.exists(docs_path):
         print("Loading initial documents...")
@@ -97,6 +127,11 @@ async def startup_event():
         except Exception as e:
             print(f"Error loading documents: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled connections to the Anthropic API"""
+    await app.state.http_client.aclose()
+
 # Custom static file handler with no-cache headers for development
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -1,19 +1,24 @@
 import os
+import sys
 from dataclasses import dataclass
+from functools import lru_cache
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file once; forked workers inherit
+# the parsed environment and skip re-reading the file
+if not os.environ.get("_RAG_ENV_LOADED"):
+    load_dotenv()
+    os.environ["_RAG_ENV_LOADED"] = "1"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
     """Configuration settings for the RAG system"""
-    # Anthropic API settings
+    # Anthropic API settings (string defaults are interned and shared process-wide)
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
-    ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
+    ANTHROPIC_MODEL: str = sys.intern("claude-sonnet-4-20250514")
     
     # Embedding model settings
-    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_MODEL: str = sys.intern("all-MiniLM-L6-v2")
     
     # Document processing settings
     CHUNK_SIZE: int = 800       # Size of text chunks for vector storage
@@ -21,8 +26,13 @@ class Config:
     MAX_RESULTS: int = 5         # Maximum search results to return (must be > 0)
     MAX_HISTORY: int = 2         # Number of conversation messages to remember
 
+    # Semantic response cache settings
+    RESPONSE_CACHE_THRESHOLD: float = 0.92  # Cosine similarity required to reuse an answer
+    RESPONSE_CACHE_TTL: int = 3600          # Seconds before a cached answer expires
+    RESPONSE_CACHE_MAX_ITEMS: int = 0       # Cached answers to keep (0, the default, disables the cache)
+
     # Database paths
-    CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
+    CHROMA_PATH: str = sys.intern("./chroma_db")  # ChromaDB storage location
 
     def __post_init__(self):
         """Validate configuration values"""
@@ -37,7 +47,14 @@ class Config:
             raise ValueError(f"CHUNK_OVERLAP cannot be negative, got {self.CHUNK_OVERLAP}")
         if self.MAX_HISTORY < 0:
             raise ValueError(f"MAX_HISTORY cannot be negative, got {self.MAX_HISTORY}")
+        if not 0 < self.RESPONSE_CACHE_THRESHOLD <= 1:
+            raise ValueError(
+                f"RESPONSE_CACHE_THRESHOLD must be in (0, 1], got {self.RESPONSE_CACHE_THRESHOLD}"
+            )
+        if self.RESPONSE_CACHE_MAX_ITEMS < 0:
+            raise ValueError(f"RESPONSE_CACHE_MAX_ITEMS cannot be negative, got {self.RESPONSE_CACHE_MAX_ITEMS}")
 
-config = Config()
-
-
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Return the shared Config instance, creating it on first use"""
+    return Config()
@@ -1,10 +1,12 @@
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Any, AsyncIterator
+import asyncio
 import os
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from ai_generator import AIGenerator
 from session_manager import SessionManager
 from search_tools import ToolManager, CourseSearchTool, CourseOutlineTool
+from response_cache import SemanticResponseCache
 from models import Course, Lesson, CourseChunk
 
 class RAGSystem:
@@ -19,12 +21,20 @@ class RAGSystem:
         self.ai_generator = AIGenerator(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
         self.session_manager = SessionManager(config.MAX_HISTORY)
         
-        # Initialize search tools
-        self.tool_manager = ToolManager()
-        self.search_tool = CourseSearchTool(self.vector_store)
-        self.tool_manager.register_tool(self.search_tool)
-        self.outline_tool = CourseOutlineTool(self.vector_store)
-        self.tool_manager.register_tool(self.outline_tool)
+        # Initialize search tools; this manager only supplies tool definitions,
+        # each query runs its tools on its own manager (see _create_tool_manager)
+        self.tool_manager = self._create_tool_manager()
+        
+        # Opt-in: reuse answers to near-identical standalone questions,
+        # embedding queries with the vector store's already-loaded model
+        self.response_cache = None
+        if config.RESPONSE_CACHE_MAX_ITEMS > 0:
+            self.response_cache = SemanticResponseCache(
+                self.vector_store.embedding_function,
+                threshold=config.RESPONSE_CACHE_THRESHOLD,
+                ttl=config.RESPONSE_CACHE_TTL,
+                max_items=config.RESPONSE_CACHE_MAX_ITEMS
+            )
     
     def add_course_document(self, file_path: str) -> Tuple[Course, int]:
         """
@@ -46,6 +56,10 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
             
+            # Cached answers may not reflect the new material
+            if self.response_cache is not None:
+                self.response_cache.clear()
+            
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
@@ -99,9 +113,13 @@ class RAGSystem:
                 except Exception as e:
                     print(f"Error processing {file_name}: {e}")
         
+        # Cached answers may not reflect the new material
+        if (clear_existing or total_courses) and self.response_cache is not None:
+            self.response_cache.clear()
+        
         return total_courses, total_chunks
     
-    def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
+    async def query(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
         """
         Process a user query using the RAG system with tool-based search.
         
@@ -120,26 +138,125 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
         
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
+        # Follow-up questions depend on history, so only standalone ones are cached
+        cached, embedding = await self._get_cached_response(query, history)
+        if cached:
+            response, sources = cached
+        else:
+            # Generate response using AI with tools
+            tool_manager = self._create_tool_manager()
+            response = await self.ai_generator.generate_response(
+                query=prompt,
+                conversation_history=history,
+                tools=self.tool_manager.get_tool_definitions(),
+                tool_manager=tool_manager
+            )
+            
+            # Get sources from this query's search tools
+            sources = tool_manager.get_last_sources()
+            
+            await self._cache_response(query, history, response, sources, embedding)
+        
+        # Update conversation history
+        if session_id:
+            self.session_manager.add_exchange(session_id, query, response)
+        
+        # Return response with sources from tool searches
+        return response, sources
+    
+    async def query_stream(self, query: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user query and stream the response as it is generated.
+        
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+            
+        Yields:
+            {"type": "text", "text": ...} events for each response fragment
+            (text from tool rounds is followed by a blank-line fragment),
+            then a single {"type": "done", "sources": [...]} event
+        """
+        prompt = f"""Answer this question about course materials: {query}"""
+        
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+        
+        cached, embedding = await self._get_cached_response(query, history)
+        if cached:
+            response, sources = cached
+            if session_id:
+                self.session_manager.add_exchange(session_id, query, response)
+            yield {"type": "text", "text": response}
+            yield {"type": "done", "sources": sources}
+            return
+        
+        chunks = []
+        separate_next_round = False
+        tool_manager = self._create_tool_manager()
+        async for event in self.ai_generator.generate_response_stream(
             query=prompt,
             conversation_history=history,
             tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager
-        )
+            tool_manager=tool_manager
+        ):
+            if event["type"] == "tool_round_end":
+                # Tool-round text was written before the results came back:
+                # it stays in the stream as its own paragraph but is not the answer
+                separate_next_round = separate_next_round or bool(chunks)
+                chunks = []
+                continue
+            if separate_next_round:
+                separate_next_round = False
+                yield {"type": "text", "text": "\n\n"}
+            chunks.append(event["text"])
+            yield event
         
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
-
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
+        # Sources live on this query's own tool manager, so a stream that is
+        # abandoned part-way leaves nothing behind for later queries
+        sources = tool_manager.get_last_sources()
         
-        # Update conversation history
+        # Store the final round's answer once streaming completes, matching
+        # what query() would have returned
+        response = "".join(chunks)
+        await self._cache_response(query, history, response, sources, embedding)
         if session_id:
             self.session_manager.add_exchange(session_id, query, response)
         
-        # Return response with sources from tool searches
-        return response, sources
+        yield {"type": "done", "sources": sources}
+    
+    def _create_tool_manager(self) -> ToolManager:
+        """
+        Build a tool manager with fresh search tools.
+        
+        Tools record the sources of their last run, and queries run
+        concurrently, so each query gets its own manager to keep its
+        sources from being read or reset by another request.
+        """
+        tool_manager = ToolManager()
+        tool_manager.register_tool(CourseSearchTool(self.vector_store))
+        tool_manager.register_tool(CourseOutlineTool(self.vector_store))
+        return tool_manager
+    
+    async def _get_cached_response(self, query: str, history: Optional[str]) -> Tuple[Optional[Tuple[str, List[str]]], Any]:
+        """
+        Look up a cached (response, sources) pair for a standalone query.
+        
+        Returns the pair (or None) and the query embedding computed for the
+        lookup (or None), which _cache_response reuses on a miss.
+        """
+        if self.response_cache is None or history:
+            return None, None
+        # Embedding the query is CPU-bound, so it runs off the event loop
+        return await asyncio.to_thread(self.response_cache.lookup, query)
+    
+    async def _cache_response(self, query: str, history: Optional[str], response: str,
+                              sources: List[str], embedding: Any = None):
+        """Cache a generated response for a standalone query"""
+        if self.response_cache is None or history or not response:
+            return
+        await asyncio.to_thread(self.response_cache.put, query, response, sources, embedding)
     
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
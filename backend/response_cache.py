@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Numbers (lesson numbers) and capitalized words (course names, acronyms)
+# that must match exactly before a similar query may reuse an answer:
+# "lesson 1" and "lesson 2" of the same course embed almost identically
+_SPECIFICS_RE = re.compile(r"\b(?:\d+|[A-Z][\w'-]*)")
+
+# Capitalized only because they start a sentence; never specifics
+_SENTENCE_STARTERS = frozenset({
+    "what", "what's", "which", "who", "whom", "whose", "how", "why", "when", "where",
+    "is", "are", "was", "were", "do", "does", "did", "can", "could", "should", "would", "will",
+    "explain", "describe", "define", "tell", "give", "list", "show", "summarize", "compare",
+    "please", "in", "on", "for", "the", "a", "an", "and", "or", "i",
+})
+
+# Nearest cached queries whose specifics are checked on a lookup
+_TOP_K = 8
+
+
+class _Entry(NamedTuple):
+    """A cached answer and the matrix row holding its query embedding"""
+    answer: str
+    sources: List[str]
+    stored_at: float
+    specifics: frozenset
+    slot: int
+
+
+class SemanticResponseCache:
+    """In-memory cache of answers keyed by query embedding similarity"""
+
+    def __init__(self, embed_fn: Callable[[List[str]], Any],
+                 threshold: float = 0.92,
+                 ttl: float = 3600,
+                 max_items: int = 5000):
+        """
+        Args:
+            embed_fn: Callable mapping a list of texts to a list of embedding vectors
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            ttl: Seconds a cached answer stays valid
+            max_items: Maximum number of cached answers (oldest evicted first)
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max_items
+
+        # max_items x dim buffer of unit-norm embeddings, allocated on the
+        # first put; rows are reused in place and _valid masks out free ones.
+        # Only rows below _used have ever held an entry.
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_items, dtype=bool)
+        self._used = 0
+        self._free_slots: List[int] = []
+        self._slot_keys: List[Optional[str]] = [None] * max_items
+
+        # Entries in insertion order, so the oldest is always first
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+        # Callers run lookups from worker threads; embedding happens outside the lock
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Look up a cached answer for a query or a semantically similar one.
+
+        Args:
+            query: User's question
+
+        Returns:
+            Tuple of (answer, sources) on a hit, None on a miss
+        """
+        return self.lookup(query)[0]
+
+    def lookup(self, query: str) -> Tuple[Optional[Tuple[str, List[str]]], Optional[np.ndarray]]:
+        """
+        Look up a cached answer, also returning the query embedding if one was computed.
+
+        Passing the embedding on to put() saves embedding the query twice on a miss.
+
+        Args:
+            query: User's question
+
+        Returns:
+            Tuple of ((answer, sources) or None, query embedding or None)
+        """
+        key = self._normalize(query)
+
+        with self._lock:
+            self._evict_expired()
+
+            # Exact repeats skip the embedding entirely
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._hit(entry), None
+            if not self._entries:
+                return None, None
+
+        embedding = self._embed(key)
+        specifics = self._specifics(query)
+
+        with self._lock:
+            if not self._entries:
+                return None, embedding
+
+            scores = self._matrix[:self._used] @ embedding
+            scores[~self._valid[:self._used]] = -np.inf
+
+            # Specifics are only compared for the nearest few rows, best first
+            k = min(_TOP_K, self._used)
+            nearest = np.argpartition(scores, -k)[-k:]
+            for slot in nearest[np.argsort(scores[nearest])[::-1]]:
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries[self._slot_keys[slot]]
+                if entry.specifics == specifics:
+                    return self._hit(entry), embedding
+
+        return None, embedding
+
+    def put(self, query: str, answer: str, sources: List[str],
+            embedding: Optional[np.ndarray] = None):
+        """
+        Store an answer and its sources for a query.
+
+        Args:
+            query: User's question
+            answer: Generated answer
+            sources: Sources shown alongside the answer
+            embedding: The query embedding from lookup(), if it computed one
+        """
+        key = self._normalize(query)
+        if embedding is None:
+            embedding = self._embed(key)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            while len(self._entries) >= self.max_items:
+                self._remove(next(iter(self._entries)))
+
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_items, embedding.shape[0]), dtype=np.float32)
+
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot = self._used
+                self._used += 1
+
+            self._matrix[slot] = embedding
+            self._valid[slot] = True
+            self._slot_keys[slot] = key
+            self._entries[key] = _Entry(answer, list(sources), time.monotonic(), self._specifics(query), slot)
+
+    def clear(self):
+        """Remove all cached answers"""
+        with self._lock:
+            self._valid[:] = False
+            self._used = 0
+            self._free_slots = []
+            self._slot_keys = [None] * self.max_items
+            self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        """Case- and whitespace-insensitive form of a query"""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _specifics(query: str) -> frozenset:
+        """Numbers and capitalized words of a query, other than common sentence starters"""
+        words = (match.lower() for match in _SPECIFICS_RE.findall(query))
+        return frozenset(word for word in words if word not in _SENTENCE_STARTERS)
+
+    @staticmethod
+    def _hit(entry: _Entry) -> Tuple[str, List[str]]:
+        """(answer, sources) for a cache entry; sources are copied so callers cannot mutate them"""
+        return entry.answer, list(entry.sources)
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Embed a single text as a unit-norm float32 vector"""
+        vector = np.asarray(self.embed_fn([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict_expired(self):
+        """Drop entries older than the TTL (entries are kept in insertion order)"""
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.stored_at >= cutoff:
+                break
+            self._remove(key)
+
+    def _remove(self, key: str):
+        """Remove an entry and mask out its matrix row for reuse"""
+        entry = self._entries.pop(key)
+        self._valid[entry.slot] = False
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
@@ -1,13 +1,14 @@
 """Shared pytest fixtures for RAG chatbot tests"""
 
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-import sys
+from unittest.mock import Mock, AsyncMock, MagicMock
 import os
+import httpx
+import orjson
+from dataclasses import dataclass, field
 
-# Add parent directory to path so we can import backend modules
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
+# Backend modules load once here, so test module imports hit sys.modules.
+# ai_generator defers the anthropic SDK import until a client is built.
 from vector_store import VectorStore, SearchResults
 from search_tools import Tool, CourseSearchTool, CourseOutlineTool, ToolManager
 from ai_generator import AIGenerator
@@ -16,79 +17,179 @@ from config import Config
 
 # API testing imports
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.testclient import TestClient
 from pydantic import BaseModel
 from typing import List, Optional
 
 
-@pytest.fixture
+# ============================================================================
+# Lightweight fakes
+#
+# Plain classes exposing only what the tests touch; cheaper to build than
+# Mock(spec=...), which introspects the whole target class per test.
+# Methods the tests assert on are still Mock attributes.
+# ============================================================================
+
+class FakeCollection:
+    """Stand-in for a ChromaDB collection"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.query = Mock(return_value={"documents": [[]], "metadatas": [[]], "distances": [[]]})
+        self.get = Mock(return_value={"ids": [], "metadatas": []})
+        self.add = Mock()
+        self.upsert = Mock()
+
+
+class FakeChromaClient:
+    """Stand-in for chromadb.PersistentClient; one FakeCollection per name"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, **kwargs):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    def delete_collection(self, name):
+        self.collections.pop(name, None)
+
+
+# Shared, never mutated: the search tools only read results
+_EMPTY_SEARCH_RESULTS = SearchResults([], [], [])
+
+
+@dataclass
+class FakeVectorStore:
+    """
+    Stand-in for VectorStore as seen by the search tools.
+
+    Every method is plain Python: tests set next_result, lesson_links,
+    course_links and course_outline, and read the recorded search_calls.
+    """
+    max_results: int = 0
+    next_result: SearchResults = field(default_factory=lambda: _EMPTY_SEARCH_RESULTS)
+    lesson_links: dict = field(default_factory=dict)
+    course_links: dict = field(default_factory=dict)
+    course_outline: Optional[dict] = None
+    search_calls: list = field(default_factory=list)
+
+    def search(self, query, course_name=None, lesson_number=None, limit=None):
+        self.search_calls.append(
+            {"query": query, "course_name": course_name, "lesson_number": lesson_number, "limit": limit}
+        )
+        return self.next_result
+
+    def get_lesson_link(self, course_title, lesson_number):
+        return self.lesson_links.get((course_title, lesson_number))
+
+    def get_course_link(self, course_title):
+        return self.course_links.get(course_title)
+
+    def get_course_outline(self, course_name):
+        return self.course_outline
+
+
+@dataclass
+class FakeToolManager:
+    """Stand-in for ToolManager as seen by AIGenerator"""
+    execute_tool: Mock = field(default_factory=lambda: Mock(return_value="No relevant content found."))
+    get_last_sources: Mock = field(default_factory=lambda: Mock(return_value=[]))
+    reset_sources: Mock = field(default_factory=Mock)
+    get_tool_definitions: Mock = field(default_factory=lambda: Mock(return_value=[
+        {"name": "search_course_content"},
+        {"name": "get_course_outline"}
+    ]))
+
+
+@dataclass
+class FakeSessionManager:
+    """Stand-in for SessionManager as seen by the API endpoints"""
+    session_id: str = "test-session-123"
+    create_session: Mock = field(init=False)
+
+    def __post_init__(self):
+        self.create_session = Mock(return_value=self.session_id)
+
+
+@dataclass
+class FakeRAGSystem:
+    """Stand-in for RAGSystem as seen by the API endpoints"""
+    session_manager: FakeSessionManager
+    query: AsyncMock
+    query_stream: Mock
+    get_course_analytics: Mock
+
+
+@pytest.fixture(scope="module")
 def mock_chroma_client():
-    """Mock ChromaDB client and collections"""
-    with patch('vector_store.chromadb') as mock_chroma:
-        # Create mock collections
-        mock_course_catalog = Mock()
-        mock_course_content = Mock()
+    """
+    In-memory Chroma client shared by a test module.
 
-        # Setup client to return appropriate collection based on name
-        mock_client = Mock()
-        def get_or_create_collection(name, **kwargs):
-            if name == "course_catalog":
-                return mock_course_catalog
-            else:  # course_content
-                return mock_course_content
+    Nothing touches chromadb or the disk: VectorStores get it injected,
+    and RAGSystem tests patch VectorStore out entirely.
+    """
+    return FakeChromaClient()
 
-        mock_client.get_or_create_collection = Mock(side_effect=get_or_create_collection)
 
-        mock_chroma.PersistentClient.return_value = mock_client
-        mock_chroma.Settings = Mock()
+@pytest.fixture
+def make_vector_store(mock_chroma_client):
+    """Build VectorStores on the module's fake client, with collections fresh per test"""
+    mock_chroma_client.collections.clear()
+
+    def factory(max_results: int = 5) -> VectorStore:
+        return VectorStore(
+            chroma_path="./test_db",
+            embedding_model="test-model",
+            max_results=max_results,
+            client=mock_chroma_client,
+            embedding_function=Mock()
+        )
+    return factory
+
+
+@pytest.fixture(scope="module")
+def vector_store_template(mock_chroma_client):
+    """One VectorStore per module; tests get it through the vector_store fixture"""
+    return VectorStore(
+        chroma_path="./test_db",
+        embedding_model="test-model",
+        client=mock_chroma_client,
+        embedding_function=Mock()
+    )
 
-        # Mock embedding function
-        mock_embedding = Mock()
-        mock_chroma.utils.embedding_functions.SentenceTransformerEmbeddingFunction.return_value = mock_embedding
 
-        yield {
-            'client': mock_client,
-            'course_catalog': mock_course_catalog,
-            'course_content': mock_course_content,
-            'embedding': mock_embedding
-        }
+@pytest.fixture
+def vector_store(vector_store_template, monkeypatch):
+    """Module VectorStore with fresh collections and max_results=5 for this test"""
+    monkeypatch.setattr(vector_store_template, "course_catalog", FakeCollection("course_catalog"))
+    monkeypatch.setattr(vector_store_template, "course_content", FakeCollection("course_content"))
+    monkeypatch.setattr(vector_store_template, "max_results", 5)
+    return vector_store_template
 
 
 @pytest.fixture
 def mock_vector_store():
-    """Mock VectorStore instance with max_results=0"""
-    store = Mock(spec=VectorStore)
-    store.max_results = 0
-    store.search = Mock()
-    store.get_lesson_link = Mock(return_value=None)
-    store.get_course_link = Mock(return_value=None)
-    store.get_course_outline = Mock(return_value=None)
-    store.course_content = Mock()
-    store.course_catalog = Mock()
-    return store
+    """Fake VectorStore instance with max_results=0"""
+    return FakeVectorStore()
 
 
 @pytest.fixture
 def mock_anthropic_client():
-    """Mock Anthropic API client"""
-    with patch('ai_generator.anthropic') as mock_anthropic:
-        mock_client = Mock()
-        mock_anthropic.Anthropic.return_value = mock_client
-        yield mock_client
+    """
+    Mock Anthropic API client.
+
+    A plain Mock rather than an autospec of the SDK, so it is cheap to build
+    per test. Tests get it into an AIGenerator via the generator fixture's
+    client swap, so the SDK module itself is never patched.
+    """
+    return Mock()
 
 
 @pytest.fixture
 def mock_tool_manager():
-    """Mock ToolManager"""
-    manager = Mock(spec=ToolManager)
-    manager.execute_tool = Mock(return_value="No relevant content found.")
-    manager.get_last_sources = Mock(return_value=[])
-    manager.reset_sources = Mock()
-    manager.get_tool_definitions = Mock(return_value=[
-        {"name": "search_course_content"},
-        {"name": "get_course_outline"}
-    ])
-    return manager
+    """Fake ToolManager"""
+    return FakeToolManager()
 
 
 @pytest.fixture
@@ -103,6 +204,9 @@ def config_max_results_zero():
     config.ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
     config.EMBEDDING_MODEL = "all-MiniLM-L6-v2"
     config.CHROMA_PATH = "./test_chroma_db"
+    config.RESPONSE_CACHE_THRESHOLD = 0.92
+    config.RESPONSE_CACHE_TTL = 3600
+    config.RESPONSE_CACHE_MAX_ITEMS = 0  # Disabled so each query reaches the generator
     return config
 
 
@@ -133,9 +237,9 @@ def sample_search_results_with_content():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_course_outline():
-    """Sample course outline for testing"""
+    """Sample course outline for testing; shared and read-only, CourseOutlineTool only formats it"""
     return {
         "course_title": "MCP: Build Rich-Context AI Apps with Anthropic",
         "course_link": "https://example.com/mcp-course",
@@ -174,39 +278,37 @@ class CourseStats(BaseModel):
 
 @pytest.fixture
 def mock_rag_system():
-    """Mock RAGSystem for API testing"""
-    mock_system = Mock(spec=RAGSystem)
-
-    # Mock session manager
-    mock_session_manager = Mock()
-    mock_session_manager.create_session = Mock(return_value="test-session-123")
-    mock_system.session_manager = mock_session_manager
-
-    # Mock query method
-    mock_system.query = Mock(return_value=("Test answer from RAG system", ["Source 1", "Source 2"]))
-
-    # Mock get_course_analytics
-    mock_system.get_course_analytics = Mock(return_value={
-        "total_courses": 3,
-        "course_titles": ["Course A", "Course B", "Course C"]
-    })
-
-    return mock_system
+    """Fake RAGSystem for API testing"""
+
+    # query_stream yields text events, then the done event with sources
+    async def query_stream(query, session_id):
+        yield {"type": "text", "text": "Test answer "}
+        yield {"type": "text", "text": "from RAG system"}
+        yield {"type": "done", "sources": ["Source 1", "Source 2"]}
+
+    return FakeRAGSystem(
+        session_manager=FakeSessionManager("test-session-123"),
+        query=AsyncMock(return_value=("Test answer from RAG system", ["Source 1", "Source 2"])),
+        query_stream=Mock(side_effect=query_stream),
+        get_course_analytics=Mock(return_value={
+            "total_courses": 3,
+            "course_titles": ["Course A", "Course B", "Course C"]
+        })
+    )
 
 
-@pytest.fixture
-def test_app(mock_rag_system):
+@pytest.fixture(scope="session")
+def _session_test_app():
     """
-    Create a test FastAPI app without static file mounting.
+    Build the test FastAPI app once per session, without static file mounting.
 
     This fixture creates a minimal app that mirrors the API endpoints
     from app.py but avoids the static files mount that causes issues
     in test environments where the frontend directory doesn't exist.
+    Endpoints read app.state.rag_system per request; test_app installs
+    a fresh fake there for every test.
     """
-    app = FastAPI(title="Course Materials RAG System - Test")
-
-    # Store mock RAG system in app state
-    app.state.rag_system = mock_rag_system
+    app = FastAPI(title="Course Materials RAG System - Test", default_response_class=ORJSONResponse)
 
     @app.post("/api/query", response_model=QueryResponse)
     async def query_documents(request: QueryRequest):
@@ -220,7 +322,7 @@ def test_app(mock_rag_system):
                 session_id = rag_system.session_manager.create_session()
 
             # Process query using RAG system
-            answer, sources = rag_system.query(request.query, session_id)
+            answer, sources = await rag_system.query(request.query, session_id)
 
             return QueryResponse(
                 answer=answer,
@@ -230,6 +332,28 @@ def test_app(mock_rag_system):
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post("/api/query/stream")
+    async def query_documents_stream(request: QueryRequest):
+        """Process a query and stream the response as server-sent events"""
+        rag_system = app.state.rag_system
+        try:
+            session_id = request.session_id
+            if not session_id:
+                session_id = rag_system.session_manager.create_session()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        async def event_stream():
+            try:
+                async for event in rag_system.query_stream(request.query, session_id):
+                    if event["type"] == "done":
+                        event = {**event, "session_id": session_id}
+                    yield b"data: " + orjson.dumps(event) + b"\n\n"
+            except Exception as e:
+                yield b"data: " + orjson.dumps({"type": "error", "detail": str(e)}) + b"\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
     @app.get("/api/courses", response_model=CourseStats)
     async def get_course_stats():
         """Get course analytics and statistics"""
@@ -252,46 +376,86 @@ def test_app(mock_rag_system):
 
 
 @pytest.fixture
-def test_client(test_app):
-    """Create a test client for API testing"""
-    return TestClient(test_app)
+def test_app(_session_test_app, mock_rag_system):
+    """Session test app with this test's fresh mock RAG system in its state"""
+    _session_test_app.state.rag_system = mock_rag_system
+    return _session_test_app
 
 
 @pytest.fixture
-def mock_rag_system_error():
-    """Mock RAGSystem that raises exceptions for error testing"""
-    mock_system = Mock(spec=RAGSystem)
+async def async_client(test_app):
+    """httpx.AsyncClient calling the test app in-process over ASGITransport"""
+    transport = httpx.ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
 
-    # Mock session manager
-    mock_session_manager = Mock()
-    mock_session_manager.create_session = Mock(return_value="error-session")
-    mock_system.session_manager = mock_session_manager
 
-    # Mock query to raise an exception
-    mock_system.query = Mock(side_effect=Exception("Database connection failed"))
+@pytest.fixture
+def query_calls(test_app):
+    """Return a callable listing the rag_system.query calls made since the test started"""
+    query = test_app.state.rag_system.query
+    start = len(query.call_args_list)
+    return lambda: query.call_args_list[start:]
+
 
-    # Mock get_course_analytics to raise an exception
-    mock_system.get_course_analytics = Mock(side_effect=Exception("Analytics service unavailable"))
+@pytest.fixture(scope="session")
+def _session_test_client(_session_test_app):
+    """Test client shared by every API test; lifespan and its event loop portal start once"""
+    with TestClient(_session_test_app) as client:
+        yield client
 
-    return mock_system
 
+@pytest.fixture
+def test_client(_session_test_client, test_app):
+    """Create a test client for API testing"""
+    return _session_test_client
 
 @pytest.fixture
-def test_app_with_errors(mock_rag_system_error):
-    """Create a test app configured to simulate errors"""
-    app = FastAPI(title="Course Materials RAG System - Error Test")
-    app.state.rag_system = mock_rag_system_error
+def mock_rag_system_error():
+    """Fake RAGSystem that raises exceptions for error testing"""
+
+    # query_stream fails after streaming has started
+    async def query_stream(query, session_id):
+        yield {"type": "text", "text": "Partial "}
+        raise Exception("Stream interrupted")
+
+    return FakeRAGSystem(
+        session_manager=FakeSessionManager("error-session"),
+        query=AsyncMock(side_effect=Exception("Database connection failed")),
+        query_stream=Mock(side_effect=query_stream),
+        get_course_analytics=Mock(side_effect=Exception("Analytics service unavailable"))
+    )
+
+
+@pytest.fixture(scope="session")
+def _session_test_app_with_errors():
+    """Build the error-scenario test app once per session"""
+    app = FastAPI(title="Course Materials RAG System - Error Test", default_response_class=ORJSONResponse)
 
     @app.post("/api/query", response_model=QueryResponse)
     async def query_documents(request: QueryRequest):
         try:
             rag_system = app.state.rag_system
             session_id = request.session_id or rag_system.session_manager.create_session()
-            answer, sources = rag_system.query(request.query, session_id)
+            answer, sources = await rag_system.query(request.query, session_id)
             return QueryResponse(answer=answer, sources=sources, session_id=session_id)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post("/api/query/stream")
+    async def query_documents_stream(request: QueryRequest):
+        rag_system = app.state.rag_system
+        session_id = request.session_id or rag_system.session_manager.create_session()
+
+        async def event_stream():
+            try:
+                async for event in rag_system.query_stream(request.query, session_id):
+                    yield b"data: " + orjson.dumps(event) + b"\n\n"
+            except Exception as e:
+                yield b"data: " + orjson.dumps({"type": "error", "detail": str(e)}) + b"\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
     @app.get("/api/courses", response_model=CourseStats)
     async def get_course_stats():
         try:
@@ -308,6 +472,34 @@ def test_app_with_errors(mock_rag_system_error):
 
 
 @pytest.fixture
-def test_client_with_errors(test_app_with_errors):
+def test_app_with_errors(_session_test_app_with_errors, mock_rag_system_error):
+    """Session error-scenario app with this test's fresh failing RAG system"""
+    _session_test_app_with_errors.state.rag_system = mock_rag_system_error
+    return _session_test_app_with_errors
+
+
+@pytest.fixture(scope="session")
+def _session_test_client_with_errors(_session_test_app_with_errors):
+    """Test client shared by every error-scenario API test; lifespan starts once"""
+    with TestClient(_session_test_app_with_errors) as client:
+        yield client
+
+
+@pytest.fixture
+def test_client_with_errors(_session_test_client_with_errors, test_app_with_errors):
     """Create a test client for error scenario testing"""
-    return TestClient(test_app_with_errors)
+    return _session_test_client_with_errors
+
+
+# ============================================================================
+# Frontend Fixtures
+# ============================================================================
+
+@pytest.fixture(scope="session")
+def html_content():
+    """Read frontend/index.html once per session (it does not change during a run)"""
+    # Navigate from backend/tests to the repository root
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    html_path = os.path.join(base_dir, "frontend", "index.html")
+    with open(html_path, "r", encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,33 @@
+"""Fixtures shared by the integration tests"""
+
+import pytest
+from unittest.mock import MagicMock
+
+import rag_system
+
+# Collaborators RAGSystem constructs itself; integration tests stub them out
+RAG_INTERNALS = ("DocumentProcessor", "SessionManager", "AIGenerator", "VectorStore")
+
+
+@pytest.fixture(scope="module")
+def _rag_internals_restored():
+    """Save RAGSystem's collaborator classes once per module and restore them afterwards"""
+    originals = {name: getattr(rag_system, name) for name in RAG_INTERNALS}
+    yield
+    for name, original in originals.items():
+        setattr(rag_system, name, original)
+
+
+@pytest.fixture
+def patched_rag(_rag_internals_restored):
+    """
+    Install fresh stub classes for RAGSystem's collaborators.
+
+    Plain attribute swaps on the rag_system module; the originals are
+    restored once when the module finishes. Tests configure the stubs
+    they need, e.g. patched_rag["VectorStore"].return_value.
+    """
+    stubs = {name: MagicMock() for name in RAG_INTERNALS}
+    for name, stub in stubs.items():
+        setattr(rag_system, name, stub)
+    return stubs
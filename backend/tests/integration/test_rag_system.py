@@ -1,313 +1,407 @@
 """Integration tests for RAGSystem end-to-end flows"""
 
+import asyncio
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-import sys
-import os
-
-# Add parent directory to path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from types import SimpleNamespace
+from unittest.mock import Mock, AsyncMock
 
+from ai_generator import AIGenerator
 from rag_system import RAGSystem
 from vector_store import SearchResults
-from config import Config
 
 
+@pytest.fixture(scope="module")
+def tool_use_mock_responses():
+    """
+    API responses for one search round: a tool_use turn, then the final answer.
+
+    Built once per module as plain namespaces; tests only read them.
+    """
+    tool_block = SimpleNamespace(
+        type="tool_use",
+        id="call_1",
+        name="search_course_content",
+        input={"query": "test content"}
+    )
+    tool_use_response = SimpleNamespace(stop_reason="tool_use", content=[tool_block])
+    final_response = SimpleNamespace(
+        stop_reason="end_turn",
+        content=[SimpleNamespace(type="text", text="No information found about that topic.")]
+    )
+    return tool_use_response, final_response
+
+
+@pytest.fixture(scope="module")
+def _config_template():
+    """Config settings shared by every factory-built config in this module"""
+    return {
+        "CHUNK_SIZE": 800,
+        "CHUNK_OVERLAP": 100,
+        "MAX_HISTORY": 2,
+        "ANTHROPIC_API_KEY": "test-key",
+        "ANTHROPIC_MODEL": "test-model",
+        "EMBEDDING_MODEL": "test-embedding",
+        "CHROMA_PATH": "./test_db",
+        "RESPONSE_CACHE_THRESHOLD": 0.92,
+        "RESPONSE_CACHE_TTL": 3600,
+        "RESPONSE_CACHE_MAX_ITEMS": 0,
+    }
+
+
+@pytest.fixture
+def config_factory(_config_template):
+    """
+    Build Config stand-ins that differ only in MAX_RESULTS.
+
+    A plain namespace rather than Config, because Config rejects
+    MAX_RESULTS=0 and the tests exercise it.
+    """
+    def make(max_results: int) -> SimpleNamespace:
+        return SimpleNamespace(**_config_template, MAX_RESULTS=max_results)
+    return make
+
+
+@pytest.mark.xdist_group("rag")
 class TestRAGSystemMaxResults:
     """Integration tests for MAX_RESULTS configuration"""
 
-    def test_rag_system_respects_max_results_config(self, mock_anthropic_client, mock_chroma_client, config_max_results_zero):
-        """Integration test: Verify complete RAG flow respects MAX_RESULTS=0"""
-
-        # Create RAG system with MAX_RESULTS=0
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator') as MockAIGen, \
-             patch('rag_system.VectorStore') as MockVectorStore:
-
-            # Setup mock VectorStore
-            mock_vector_store_instance = Mock()
-            mock_vector_store_instance.max_results = 0
-
-            # Mock ChromaDB query to verify n_results=0 is passed
-            mock_search_response = {
-                "documents": [[]],
-                "metadatas": [[]],
-                "distances": [[]]
-            }
-            mock_vector_store_instance.course_content.query = Mock(
-                return_value=mock_search_response
-            )
-            mock_vector_store_instance.search = Mock(
-                return_value=SearchResults.from_chroma(mock_search_response)
-            )
-            mock_vector_store_instance.get_lesson_link = Mock(return_value=None)
-            mock_vector_store_instance.get_course_link = Mock(return_value=None)
-
-            MockVectorStore.return_value = mock_vector_store_instance
-
-            # Setup mock AIGenerator
-            mock_ai_gen_instance = Mock()
-
-            # First response: Claude decides to use search tool
-            tool_use_response = Mock()
-            tool_use_response.stop_reason = "tool_use"
-
-            tool_block = Mock()
-            tool_block.type = "tool_use"
-            tool_block.id = "call_1"
-            tool_block.name = "search_course_content"
-            tool_block.input = {"query": "test content"}
-
-            tool_use_response.content = [tool_block]
-
-            # Second response: Claude answers with empty results
-            final_response = Mock()
-            final_text = Mock()
-            final_text.text = "No information found about that topic."
-            final_response.content = [final_text]
-
-            mock_ai_gen_instance.client = Mock()
-            mock_ai_gen_instance.client.messages.create = Mock(
-                side_effect=[tool_use_response, final_response]
-            )
-            mock_ai_gen_instance.generate_response = Mock(
-                return_value="No information found about that topic."
-            )
-
-            MockAIGen.return_value = mock_ai_gen_instance
-
-            # Create RAG system
-            rag_system = RAGSystem(config_max_results_zero)
-
-            # Execute query
-            response, sources = rag_system.query("What is in lesson 1?")
-
-            # Assertions:
-            # 1. Verify VectorStore was initialized with max_results=0
-            assert mock_vector_store_instance.max_results == 0
-
-            # 2. Verify response indicates no results
-            assert "No information found" in response
-
-            # 3. Verify sources list is empty
-            assert sources == []
+    async def test_rag_system_respects_max_results_config(self, patched_rag, config_max_results_zero, tool_use_mock_responses):
+        """Integration test: Verify the RAG flow with MAX_RESULTS=0 runs the real tool loop end to end"""
 
-    @pytest.mark.parametrize("max_results", [0, 1, 3, 5])
-    def test_rag_system_max_results_values(self, max_results, mock_chroma_client):
-        """Parametrized: Verify RAGSystem respects various MAX_RESULTS settings"""
+        MockAIGen = patched_rag["AIGenerator"]
+        MockVectorStore = patched_rag["VectorStore"]
 
-        config = Mock(spec=Config)
-        config.MAX_RESULTS = max_results
-        config.CHUNK_SIZE = 800
-        config.CHUNK_OVERLAP = 100
-        config.MAX_HISTORY = 2
-        config.ANTHROPIC_API_KEY = "test-key"
-        config.ANTHROPIC_MODEL = "test-model"
-        config.EMBEDDING_MODEL = "test-embedding"
-        config.CHROMA_PATH = "./test_db"
+        # Setup stub VectorStore; plain namespace recording the searches it serves
+        search_calls = []
+        mock_vector_store_instance = SimpleNamespace(
+            search=lambda **kwargs: search_calls.append(kwargs) or SearchResults([], [], []),
+            get_lesson_link=lambda *args: None,
+            get_course_link=lambda *args: None
+        )
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator'), \
-             patch('rag_system.VectorStore') as MockVectorStore:
+        MockVectorStore.return_value = mock_vector_store_instance
 
-            mock_vector_store_instance = Mock()
-            mock_vector_store_instance.max_results = max_results
-            MockVectorStore.return_value = mock_vector_store_instance
+        # A real AIGenerator whose API client replays the tool_use and final responses
+        responses = iter(tool_use_mock_responses)
+        requests = []
 
-            rag_system = RAGSystem(config)
+        async def create(**kwargs):
+            requests.append(list(kwargs["messages"]))
+            return next(responses)
 
-            # Verify VectorStore was initialized with correct max_results
-            assert rag_system.vector_store.max_results == max_results
+        ai_generator = AIGenerator(api_key="test-key", model="test-model")
+        ai_generator.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        MockAIGen.return_value = ai_generator
 
+        # Create RAG system
+        rag_system = RAGSystem(config_max_results_zero)
 
-class TestRAGSystemToolIntegration:
-    """Integration tests for tool registration and execution"""
+        # Execute query
+        response, sources = await rag_system.query("What is in lesson 1?")
 
-    def test_rag_system_registers_all_tools(self, mock_chroma_client, config_max_results_zero):
-        """Verify RAGSystem registers both search and outline tools"""
+        # Assertions:
+        # 1. Verify VectorStore was built with MAX_RESULTS=0 from the config
+        MockVectorStore.assert_called_once_with(
+            config_max_results_zero.CHROMA_PATH, config_max_results_zero.EMBEDDING_MODEL, 0
+        )
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator'), \
-             patch('rag_system.VectorStore'):
+        # 2. Verify the tool call reached the store and its empty result went back to the model
+        assert search_calls == [{"query": "test content", "course_name": None, "lesson_number": None}]
+        assert len(requests) == 2
+        assert requests[1][-1]["content"][0]["content"] == "No relevant content found."
 
-            rag_system = RAGSystem(config_max_results_zero)
+        # 3. Verify the final answer is returned with no sources
+        assert response == "No information found about that topic."
+        assert sources == []
 
-            # Verify both tools are registered
-            tool_definitions = rag_system.tool_manager.get_tool_definitions()
-            tool_names = [tool['name'] for tool in tool_definitions]
+    @pytest.mark.parametrize("max_results", [0, 1, 3, 5])
+    def test_rag_system_max_results_values(self, max_results, patched_rag, config_factory):
+        """Parametrized: Verify RAGSystem respects various MAX_RESULTS settings"""
 
-            assert 'search_course_content' in tool_names
-            assert 'get_course_outline' in tool_names
+        config = config_factory(max_results)
 
-    def test_rag_system_source_tracking(self, mock_anthropic_client, mock_chroma_client, config_max_results_zero):
-        """Verify RAGSystem correctly tracks and returns sources"""
+        MockVectorStore = patched_rag["VectorStore"]
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator') as MockAIGen, \
-             patch('rag_system.VectorStore') as MockVectorStore:
+        mock_vector_store_instance = Mock()
+        mock_vector_store_instance.max_results = max_results
+        MockVectorStore.return_value = mock_vector_store_instance
 
-            # Setup mock VectorStore with results
-            mock_vector_store_instance = Mock()
-            results_with_content = SearchResults(
-                documents=["Test content"],
-                metadata=[{"course_title": "Test Course", "lesson_number": 1, "chunk_index": 0}],
-                distances=[0.1]
-            )
-            mock_vector_store_instance.search = Mock(return_value=results_with_content)
-            mock_vector_store_instance.get_lesson_link = Mock(return_value="http://test.com/lesson1")
+        rag_system = RAGSystem(config)
+
+        # Verify VectorStore was initialized with correct max_results
+        assert rag_system.vector_store.max_results == max_results
 
-            MockVectorStore.return_value = mock_vector_store_instance
 
-            # Setup mock AIGenerator
-            mock_ai_gen_instance = Mock()
-            mock_ai_gen_instance.generate_response = Mock(return_value="Here's what I found")
+@pytest.mark.xdist_group("rag")
+class TestRAGSystemToolIntegration:
+    """Integration tests for tool registration and execution"""
 
-            MockAIGen.return_value = mock_ai_gen_instance
+    @pytest.mark.parametrize("results,ai_response,expected_sources", [
+        (
+            SearchResults([], [], [], error="Database connection failed"),
+            "I encountered an error searching the database.",
+            []
+        ),
+        (
+            SearchResults([], [], []),
+            "I couldn't find any information about that.",
+            []
+        ),
+        (
+            SearchResults(
+                documents=["Test content"],
+                metadata=[{"course_title": "Test Course", "lesson_number": 1, "chunk_index": 0}],
+                distances=[0.1]
+            ),
+            "Here's what I found",
+            ["[Test Course - Lesson 1](http://test.com/lesson1)"]
+        ),
+    ], ids=["vector_store_error", "empty_results", "with_sources"])
+    async def test_rag_system_search_paths(self, patched_rag, config_max_results_zero,
+                                           results, ai_response, expected_sources):
+        """Verify query answers and sources for error, empty and successful searches"""
+
+        mock_vector_store_instance = Mock()
+        mock_vector_store_instance.search = Mock(return_value=results)
+        mock_vector_store_instance.get_lesson_link = Mock(return_value="http://test.com/lesson1")
+        patched_rag["VectorStore"].return_value = mock_vector_store_instance
+
+        # The generator runs the search tool the way Claude would, then answers
+        async def generate_response(query, conversation_history=None, tools=None, tool_manager=None):
+            tool_manager.execute_tool("search_course_content", query="test")
+            return ai_response
+
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response = AsyncMock(side_effect=generate_response)
+        patched_rag["AIGenerator"].return_value = mock_ai_gen_instance
+
+        rag_system = RAGSystem(config_max_results_zero)
+
+        response, sources = await rag_system.query("Test question")
+
+        # Errors are handled without raising; sources come from the tool run
+        assert response == ai_response
+        assert sources == expected_sources
+        mock_vector_store_instance.search.assert_called_once()
+
+    async def test_rag_system_sources_reset_between_queries(self, patched_rag, config_max_results_zero):
+        """Verify a query that runs no tools does not return the previous query's sources"""
+
+        mock_vector_store_instance = Mock()
+        mock_vector_store_instance.search = Mock(return_value=SearchResults(
+            documents=["Test content"],
+            metadata=[{"course_title": "Test Course", "lesson_number": None}],
+            distances=[0.1]
+        ))
+        mock_vector_store_instance.get_course_link = Mock(return_value=None)
+        patched_rag["VectorStore"].return_value = mock_vector_store_instance
+
+        async def generate_response(query, conversation_history=None, tools=None, tool_manager=None):
+            if "First" in query:
+                tool_manager.execute_tool("search_course_content", query="test")
+            return "Response"
+
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response = AsyncMock(side_effect=generate_response)
+        patched_rag["AIGenerator"].return_value = mock_ai_gen_instance
+
+        rag_system = RAGSystem(config_max_results_zero)
+
+        assert await rag_system.query("First question") == ("Response", ["Test Course"])
+        assert await rag_system.query("Second question") == ("Response", [])
+
+    async def test_rag_system_concurrent_queries_keep_own_sources(self, patched_rag, config_max_results_zero):
+        """Verify interleaved queries each return the sources of their own searches"""
+
+        mock_vector_store_instance = Mock()
+        mock_vector_store_instance.search = Mock(side_effect=lambda query, **kwargs: SearchResults(
+            documents=[f"{query} content"],
+            metadata=[{"course_title": f"{query} course", "lesson_number": None}],
+            distances=[0.1]
+        ))
+        mock_vector_store_instance.get_course_link = Mock(return_value=None)
+        patched_rag["VectorStore"].return_value = mock_vector_store_instance
+
+        # The slow query searches first and answers last, so the fast query's
+        # whole search-and-answer runs while the slow one is still in flight
+        slow_searched = asyncio.Event()
+        fast_answered = asyncio.Event()
+
+        async def generate_response(query, conversation_history=None, tools=None, tool_manager=None):
+            if "slow" in query:
+                tool_manager.execute_tool("search_course_content", query="slow")
+                slow_searched.set()
+                await fast_answered.wait()
+                return "Slow answer"
+            await slow_searched.wait()
+            tool_manager.execute_tool("search_course_content", query="fast")
+            fast_answered.set()
+            return "Fast answer"
+
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response = AsyncMock(side_effect=generate_response)
+        patched_rag["AIGenerator"].return_value = mock_ai_gen_instance
+
+        rag_system = RAGSystem(config_max_results_zero)
+
+        slow, fast = await asyncio.gather(
+            rag_system.query("slow question"),
+            rag_system.query("fast question")
+        )
+
+        assert slow == ("Slow answer", ["slow course"])
+        assert fast == ("Fast answer", ["fast course"])
+
+
+@pytest.mark.xdist_group("rag")
+class TestRAGSystemSessionManagement:
+    """Integration tests for conversation history management"""
 
-            # Create RAG system
-            rag_system = RAGSystem(config_max_results_zero)
+    async def test_rag_system_creates_session(self, patched_rag, config_max_results_zero):
+        """Verify RAGSystem creates session history"""
 
-            # Manually set up tool for this test
-            from search_tools import CourseSearchTool
-            search_tool = CourseSearchTool(mock_vector_store_instance)
+        MockSessionManager = patched_rag["SessionManager"]
+        MockAIGen = patched_rag["AIGenerator"]
 
-            # Execute search tool directly to track sources
-            search_tool.execute(query="test")
+        mock_session_manager = Mock()
+        mock_session_manager.get_conversation_history = Mock(return_value=None)
+        mock_session_manager.add_exchange = Mock()
 
-            # Simulate source retrieval
-            sources = search_tool.last_sources
+        MockSessionManager.return_value = mock_session_manager
 
-            # Verify sources are tracked
-            assert len(sources) > 0
-            assert "Test Course - Lesson 1" in sources[0]
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response = AsyncMock(return_value="Answer")
 
-    def test_rag_system_sources_reset_between_queries(self, mock_anthropic_client, mock_chroma_client, config_max_results_zero):
-        """Verify sources are reset between queries to prevent carryover"""
+        MockAIGen.return_value = mock_ai_gen_instance
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator') as MockAIGen, \
-             patch('rag_system.VectorStore') as MockVectorStore:
+        rag_system = RAGSystem(config_max_results_zero)
 
-            mock_vector_store_instance = Mock()
-            mock_vector_store_instance.search = Mock(return_value=SearchResults([], [], []))
+        # Query with session_id
+        await rag_system.query("Test question", session_id="session_123")
 
-            MockVectorStore.return_value = mock_vector_store_instance
+        # Verify session methods were called
+        mock_session_manager.get_conversation_history.assert_called_with("session_123")
+        mock_session_manager.add_exchange.assert_called_once()
 
-            mock_ai_gen_instance = Mock()
-            mock_ai_gen_instance.generate_response = Mock(return_value="Response")
+    async def test_rag_system_query_stream_stores_full_answer(self, patched_rag, config_max_results_zero):
+        """Verify streamed queries record the joined answer in session history"""
 
-            MockAIGen.return_value = mock_ai_gen_instance
+        MockSessionManager = patched_rag["SessionManager"]
+        MockAIGen = patched_rag["AIGenerator"]
 
-            rag_system = RAGSystem(config_max_results_zero)
+        mock_session_manager = Mock()
+        mock_session_manager.get_conversation_history = Mock(return_value=None)
+        MockSessionManager.return_value = mock_session_manager
 
-            # First query
-            rag_system.query("First question")
+        async def generate_response_stream(**kwargs):
+            yield {"type": "text", "text": "Streamed "}
+            yield {"type": "text", "text": "answer"}
 
-            # Verify reset_sources is called
-            assert rag_system.tool_manager.reset_sources is not None
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response_stream = Mock(side_effect=generate_response_stream)
+        MockAIGen.return_value = mock_ai_gen_instance
 
+        rag_system = RAGSystem(config_max_results_zero)
 
-class TestRAGSystemSessionManagement:
-    """Integration tests for conversation history management"""
+        events = [event async for event in rag_system.query_stream("Test question", session_id="session_123")]
 
-    def test_rag_system_creates_session(self, mock_anthropic_client, mock_chroma_client, config_max_results_zero):
-        """Verify RAGSystem creates session history"""
+        assert [e["text"] for e in events if e["type"] == "text"] == ["Streamed ", "answer"]
+        assert events[-1] == {"type": "done", "sources": []}
+        mock_session_manager.add_exchange.assert_called_once_with(
+            "session_123", "Test question", "Streamed answer"
+        )
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager') as MockSessionManager, \
-             patch('rag_system.AIGenerator') as MockAIGen, \
-             patch('rag_system.VectorStore'):
+    async def test_rag_system_query_stream_keeps_only_final_round_answer(self, patched_rag, config_max_results_zero):
+        """Verify tool-round preamble is streamed as its own paragraph but not stored as the answer"""
 
-            mock_session_manager = Mock()
-            mock_session_manager.get_conversation_history = Mock(return_value=None)
-            mock_session_manager.add_exchange = Mock()
+        MockSessionManager = patched_rag["SessionManager"]
+        MockAIGen = patched_rag["AIGenerator"]
 
-            MockSessionManager.return_value = mock_session_manager
+        mock_session_manager = Mock()
+        mock_session_manager.get_conversation_history = Mock(return_value=None)
+        MockSessionManager.return_value = mock_session_manager
 
-            mock_ai_gen_instance = Mock()
-            mock_ai_gen_instance.generate_response = Mock(return_value="Answer")
+        async def generate_response_stream(**kwargs):
+            yield {"type": "text", "text": "Let me search."}
+            yield {"type": "tool_round_end"}
+            yield {"type": "tool_round_end"}
+            yield {"type": "text", "text": "Final answer"}
 
-            MockAIGen.return_value = mock_ai_gen_instance
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response_stream = Mock(side_effect=generate_response_stream)
+        MockAIGen.return_value = mock_ai_gen_instance
 
-            rag_system = RAGSystem(config_max_results_zero)
+        rag_system = RAGSystem(config_max_results_zero)
 
-            # Query with session_id
-            rag_system.query("Test question", session_id="session_123")
+        events = [event async for event in rag_system.query_stream("Test question", session_id="session_123")]
 
-            # Verify session methods were called
-            mock_session_manager.get_conversation_history.assert_called_with("session_123")
-            mock_session_manager.add_exchange.assert_called_once()
+        assert [e["text"] for e in events if e["type"] == "text"] == ["Let me search.", "\n\n", "Final answer"]
+        mock_session_manager.add_exchange.assert_called_once_with(
+            "session_123", "Test question", "Final answer"
+        )
 
 
-class TestRAGSystemErrorHandling:
-    """Integration tests for error handling scenarios"""
+@pytest.mark.xdist_group("rag")
+class TestRAGSystemResponseCache:
+    """Integration tests for the semantic response cache"""
 
-    def test_rag_system_handles_vector_store_errors(self, mock_anthropic_client, mock_chroma_client, config_max_results_zero):
-        """Verify RAGSystem handles VectorStore errors gracefully"""
+    async def test_rag_system_reuses_cached_answer_for_standalone_query(self, patched_rag, config_max_results_zero):
+        """Verify a repeated standalone question is answered from the cache"""
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator') as MockAIGen, \
-             patch('rag_system.VectorStore') as MockVectorStore:
+        config_max_results_zero.RESPONSE_CACHE_MAX_ITEMS = 10
 
-            # Setup mock VectorStore that returns error
-            mock_vector_store_instance = Mock()
-            error_results = SearchResults(
-                documents=[],
-                metadata=[],
-                distances=[],
-                error="Database connection failed"
-            )
-            mock_vector_store_instance.search = Mock(return_value=error_results)
+        MockSessionManager = patched_rag["SessionManager"]
+        MockAIGen = patched_rag["AIGenerator"]
+        MockVectorStore = patched_rag["VectorStore"]
 
-            MockVectorStore.return_value = mock_vector_store_instance
+        mock_vector_store_instance = Mock()
+        mock_vector_store_instance.embedding_function = Mock(return_value=[[1.0, 0.0]])
+        MockVectorStore.return_value = mock_vector_store_instance
 
-            # Setup mock AIGenerator
-            mock_ai_gen_instance = Mock()
-            mock_ai_gen_instance.generate_response = Mock(return_value="I encountered an error searching the database.")
+        mock_session_manager = Mock()
+        mock_session_manager.get_conversation_history = Mock(return_value=None)
+        MockSessionManager.return_value = mock_session_manager
 
-            MockAIGen.return_value = mock_ai_gen_instance
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response = AsyncMock(return_value="Cached answer")
+        MockAIGen.return_value = mock_ai_gen_instance
 
-            rag_system = RAGSystem(config_max_results_zero)
+        rag_system = RAGSystem(config_max_results_zero)
 
-            # Execute query
-            response, sources = rag_system.query("Test question")
+        first = await rag_system.query("What is MCP?", session_id="session_1")
+        second = await rag_system.query("what is  MCP?", session_id="session_2")
 
-            # Verify error is handled (no exception raised)
-            assert response is not None
-            assert sources == []
+        assert first == second == ("Cached answer", [])
+        mock_ai_gen_instance.generate_response.assert_awaited_once()
+        assert mock_session_manager.add_exchange.call_count == 2
 
-    def test_rag_system_handles_empty_results(self, mock_anthropic_client, mock_chroma_client, config_max_results_zero):
-        """Verify RAGSystem handles empty search results correctly"""
+    async def test_rag_system_skips_cache_for_follow_up_questions(self, patched_rag, config_max_results_zero):
+        """Verify questions with conversation history always reach the generator"""
 
-        with patch('rag_system.DocumentProcessor'), \
-             patch('rag_system.SessionManager'), \
-             patch('rag_system.AIGenerator') as MockAIGen, \
-             patch('rag_system.VectorStore') as MockVectorStore:
+        config_max_results_zero.RESPONSE_CACHE_MAX_ITEMS = 10
 
-            # Setup mock VectorStore with empty results
-            mock_vector_store_instance = Mock()
-            empty_results = SearchResults(documents=[], metadata=[], distances=[])
-            mock_vector_store_instance.search = Mock(return_value=empty_results)
+        MockSessionManager = patched_rag["SessionManager"]
+        MockAIGen = patched_rag["AIGenerator"]
+        MockVectorStore = patched_rag["VectorStore"]
 
-            MockVectorStore.return_value = mock_vector_store_instance
+        mock_vector_store_instance = Mock()
+        mock_vector_store_instance.embedding_function = Mock(return_value=[[1.0, 0.0]])
+        MockVectorStore.return_value = mock_vector_store_instance
 
-            # Setup mock AIGenerator
-            mock_ai_gen_instance = Mock()
-            mock_ai_gen_instance.generate_response = Mock(return_value="I couldn't find any information about that.")
+        mock_session_manager = Mock()
+        mock_session_manager.get_conversation_history = Mock(
+            return_value="User: Earlier question\nAssistant: Earlier answer"
+        )
+        MockSessionManager.return_value = mock_session_manager
 
-            MockAIGen.return_value = mock_ai_gen_instance
+        mock_ai_gen_instance = Mock()
+        mock_ai_gen_instance.generate_response = AsyncMock(return_value="Fresh answer")
+        MockAIGen.return_value = mock_ai_gen_instance
 
-            rag_system = RAGSystem(config_max_results_zero)
+        rag_system = RAGSystem(config_max_results_zero)
 
-            # Execute query
-            response, sources = rag_system.query("Test question")
+        await rag_system.query("What about lesson 2?", session_id="session_1")
+        await rag_system.query("What about lesson 2?", session_id="session_1")
 
-            # Verify empty results are handled
-            assert response is not None
-            assert "couldn't find" in response.lower() or "no information" in response.lower()
+        assert mock_ai_gen_instance.generate_response.await_count == 2
+        assert len(rag_system.response_cache) == 0
@@ -0,0 +1,34 @@
+"""
+Fixtures shared by the unit tests.
+
+Module-scoped fixtures are read-only prototypes. Anything a test mutates
+(the Anthropic client, the tool manager) stays function-scoped, and the
+shared generator has its client swapped in fresh for every test.
+"""
+
+import pytest
+from types import SimpleNamespace
+
+from ai_generator import AIGenerator
+
+
+@pytest.fixture(scope="module")
+def ai_generator_template():
+    """One AIGenerator per module; its prompt blocks and params never change"""
+    return AIGenerator(api_key="test-key", model="test-model")
+
+
+@pytest.fixture
+def generator(ai_generator_template, mock_anthropic_client):
+    """Module AIGenerator with this test's fresh mock Anthropic client swapped in"""
+    ai_generator_template.client = mock_anthropic_client
+    return ai_generator_template
+
+
+@pytest.fixture
+def direct_response_mock():
+    """API response that answers directly (end_turn) with one text block"""
+    return SimpleNamespace(
+        stop_reason="end_turn",
+        content=[SimpleNamespace(type="text", text="Response")]
+    )
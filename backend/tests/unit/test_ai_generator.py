@@ -1,40 +1,85 @@
 """Unit tests for AIGenerator component"""
 
+import time
 import pytest
-from unittest.mock import Mock, MagicMock
-import sys
-import os
-
-# Add parent directory to path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from types import SimpleNamespace
+from unittest.mock import Mock, AsyncMock, patch
 
+import ai_generator
 from ai_generator import AIGenerator
+from search_tools import CourseSearchTool, ToolManager
+from vector_store import SearchResults
+
+
+def make_tool_block(id, name, input):
+    """tool_use content block as returned by the SDK"""
+    return SimpleNamespace(type="tool_use", id=id, name=name, input=input)
+
+
+def make_text_block(text):
+    """text content block as returned by the SDK"""
+    return SimpleNamespace(type="text", text=text)
+
+
+def make_response(stop_reason, content):
+    """messages.create response with the given stop reason and content blocks"""
+    return SimpleNamespace(stop_reason=stop_reason, content=content)
+
+
+def make_final(text, stop_reason="end_turn"):
+    """Response carrying a single text block, as for a final answer"""
+    return make_response(stop_reason, [make_text_block(text)])
+
+
+def snapshot_messages_create(responses, snapshots):
+    """
+    Build a messages.create mock that records a copy of messages per call.
+
+    The generator appends to one messages list across rounds, so call_args
+    alone would only show the final state of that list.
+    """
+    replies = iter(responses)
+
+    async def create(**kwargs):
+        snapshots.append(list(kwargs['messages']))
+        return next(replies)
+
+    return AsyncMock(side_effect=create)
+
+
+def sequence_create(*responses):
+    """
+    Plain async messages.create stand-in that returns responses in order.
+
+    For tests that only need sequencing and a call count, this skips the
+    call recording an AsyncMock does on every call.
+    """
+    replies = iter(responses)
+
+    async def create(**kwargs):
+        create.call_count += 1
+        return next(replies)
+
+    create.call_count = 0
+    return create
 
 
+SEARCH_TOOL = {"name": "search_course_content", "description": "Search courses"}
+SEARCH_TOOL_DEFS = [SEARCH_TOOL]
+
+
+@pytest.mark.xdist_group("ai_generator")
 class TestAIGeneratorToolExecution:
     """Test cases for AIGenerator tool calling and execution"""
 
-    def test_ai_generator_handles_empty_tool_results(self, mock_anthropic_client, mock_tool_manager):
+    async def test_ai_generator_handles_empty_tool_results(self, generator, mock_anthropic_client, mock_tool_manager):
         """Verify AIGenerator processes empty tool results correctly"""
 
-        generator = AIGenerator(
-            api_key="test-key",
-            model="claude-sonnet-4-20250514"
-        )
-        generator.client = mock_anthropic_client
-
         # Setup mock: Claude requests tool use, tool returns empty
-        tool_use_response = Mock()
-        tool_use_response.stop_reason = "tool_use"
-
         # Create a mock content block for tool use
-        tool_use_block = Mock()
-        tool_use_block.type = "tool_use"
-        tool_use_block.id = "call_123"
-        tool_use_block.name = "search_course_content"
-        tool_use_block.input = {"query": "lesson content"}
+        tool_use_block = make_tool_block(id="call_123", name="search_course_content", input={"query": "lesson content"})
 
-        tool_use_response.content = [tool_use_block]
+        tool_use_response = make_response("tool_use", [tool_use_block])
 
         # Tool manager returns empty results
         mock_tool_manager.execute_tool = Mock(
@@ -42,20 +87,15 @@ class TestAIGeneratorToolExecution:
         )
 
         # Final response from Claude after tool result
-        final_response = Mock()
-        final_text = Mock()
-        final_text.text = "I couldn't find information about that."
-        final_response.content = [final_text]
+        final_response = make_final("I couldn't find information about that.")
 
         # Mock Anthropic client to return these responses in sequence
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[tool_use_response, final_response]
-        )
+        mock_anthropic_client.messages.create = sequence_create(tool_use_response, final_response)
 
         # Generate response
-        result = generator.generate_response(
+        result = await generator.generate_response(
             query="What's in lesson 1?",
-            tools=mock_tool_manager.get_tool_definitions(),
+            tools=SEARCH_TOOL_DEFS,
             tool_manager=mock_tool_manager
         )
 
@@ -72,94 +112,137 @@ class TestAIGeneratorToolExecution:
         # 3. Final response returned
         assert result == "I couldn't find information about that."
 
-    def test_ai_generator_direct_response_without_tools(self, mock_anthropic_client):
-        """Verify AIGenerator returns direct response when no tool use occurs"""
-
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
-        # Mock response without tool use
-        direct_response = Mock()
-        direct_response.stop_reason = "end_turn"
-        direct_text = Mock()
-        direct_text.text = "Hello! I can help with course questions."
-        direct_response.content = [direct_text]
-
-        mock_anthropic_client.messages.create = Mock(return_value=direct_response)
-
-        result = generator.generate_response(query="Hi there")
+    @pytest.mark.parametrize("history,tools,key,expected", [
+        (None, None, "temperature", 0),
+        (None, None, "max_tokens", 800),
+        (None, None, "model", "test-model"),
+        (
+            "User: Previous question\nAssistant: Previous answer",
+            None,
+            "messages",
+            [
+                {"role": "user", "content": "Previous question"},
+                {"role": "assistant", "content": "Previous answer"},
+                {"role": "user", "content": "Hi there"}
+            ]
+        ),
+        (
+            # History goes into messages, so the system prompt stays the cached block
+            "User: Previous question\nAssistant: Previous answer",
+            None,
+            "system",
+            [{"type": "text", "text": AIGenerator.SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+        ),
+        (None, SEARCH_TOOL_DEFS, "tools", [{**SEARCH_TOOL, "cache_control": {"type": "ephemeral"}}]),
+        (None, SEARCH_TOOL_DEFS, "tool_choice", {"type": "auto"}),
+    ], ids=["temperature", "max_tokens", "model", "history_messages", "history_system",
+            "tools_cache_breakpoint", "tool_choice"])
+    def test_build_api_params(self, generator, history, tools, key, expected):
+        """Verify the first-round API parameters built for a query"""
+
+        api_params = generator._build_api_params("Hi there", history, tools)
+
+        assert api_params[key] == expected
+
+        # Caller's tool definitions are not mutated
+        assert 'cache_control' not in SEARCH_TOOL
+
+    @pytest.mark.parametrize("call_kwargs", [
+        {},
+        # Bare sentinel: an end_turn reply must never touch the tool manager
+        {"tools": SEARCH_TOOL_DEFS, "tool_manager": object()},
+    ], ids=["no_tools", "tools_without_tool_use"])
+    async def test_direct_response_single_call(self, generator, mock_anthropic_client, direct_response_mock,
+                                               call_kwargs):
+        """Verify a direct (end_turn) answer takes one call and returns its text"""
+
+        mock_anthropic_client.messages.create = AsyncMock(return_value=direct_response_mock)
+
+        result = await generator.generate_response(query="Hi there", **call_kwargs)
+
+        mock_anthropic_client.messages.create.assert_awaited_once()
+        assert result == "Response"
+
+    def test_ai_generator_passes_http_client_to_sdk(self):
+        """Verify an injected HTTP client reaches the SDK and the default lets the SDK build its own"""
+
+        http_client = object()
+        with patch('ai_generator._anthropic_module') as mock_anthropic_module:
+            AIGenerator(api_key="key-1", model="test-model", http_client=http_client)
+            AIGenerator(api_key="key-2", model="test-model")
+
+        calls = mock_anthropic_module.return_value.AsyncAnthropic.call_args_list
+        assert [call.kwargs['http_client'] for call in calls] == [http_client, None]
+
+    def test_generate_response_sync_runs_async_path(self, generator, mock_anthropic_client):
+        """Verify the sync facade drives the async generator on a fresh HTTP client per call"""
+
+        direct_response = make_final("Sync answer")
+
+        mock_anthropic_client.messages.create = AsyncMock(return_value=direct_response)
+        http_clients = []
+        mock_anthropic_client.with_options = Mock(
+            side_effect=lambda http_client: http_clients.append(http_client) or mock_anthropic_client
+        )
 
-        # Verify only one API call was made
-        assert mock_anthropic_client.messages.create.call_count == 1
+        results = [generator.generate_response_sync(query="Hi there") for _ in range(2)]
 
-        # Verify direct response returned
-        assert result == "Hello! I can help with course questions."
+        assert results == ["Sync answer", "Sync answer"]
+        assert mock_anthropic_client.messages.create.await_count == 2
+        # Each asyncio.run gets its own client, closed before the loop ends
+        assert http_clients[0] is not http_clients[1]
+        assert all(http_client.is_closed for http_client in http_clients)
+        assert generator.client is mock_anthropic_client
 
-    def test_ai_generator_includes_conversation_history(self, mock_anthropic_client):
-        """Verify AIGenerator includes conversation history in system prompt"""
+    def test_history_to_messages_keeps_multiline_content(self, generator):
+        """Verify lines without a role prefix continue the previous message"""
 
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
+        messages = generator._history_to_messages(
+            "User: First line\nsecond line\nAssistant: Answer"
+        )
 
-        direct_response = Mock()
-        direct_response.stop_reason = "end_turn"
-        direct_text = Mock()
-        direct_text.text = "Response"
-        direct_response.content = [direct_text]
+        assert messages == [
+            {"role": "user", "content": "First line\nsecond line"},
+            {"role": "assistant", "content": "Answer"}
+        ]
+        assert generator._history_to_messages(None) == []
 
-        mock_anthropic_client.messages.create = Mock(return_value=direct_response)
+    def test_history_to_messages_fills_empty_turns(self, generator):
+        """Verify empty past queries and answers never become empty-content messages"""
 
-        conversation_history = "User: Previous question\nAssistant: Previous answer"
-        generator.generate_response(
-            query="New question",
-            conversation_history=conversation_history
+        messages = generator._history_to_messages(
+            "User: \nAssistant: Answer\nUser: Next question\nAssistant: "
         )
 
-        # Verify system prompt includes conversation history
-        call_args = mock_anthropic_client.messages.create.call_args
-        system_prompt = call_args.kwargs['system']
-        assert "Previous conversation:" in system_prompt
-        assert conversation_history in system_prompt
+        assert messages == [
+            {"role": "user", "content": ai_generator._EMPTY_TURN},
+            {"role": "assistant", "content": "Answer"},
+            {"role": "user", "content": "Next question"},
+            {"role": "assistant", "content": ai_generator._EMPTY_TURN}
+        ]
 
-    def test_ai_generator_tool_execution_with_multiple_blocks(self, mock_anthropic_client, mock_tool_manager):
+    async def test_ai_generator_tool_execution_with_multiple_blocks(self, generator, mock_anthropic_client, mock_tool_manager):
         """Verify AIGenerator handles tool results when there are multiple content blocks"""
 
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
         # Setup tool use response with multiple blocks
-        tool_use_response = Mock()
-        tool_use_response.stop_reason = "tool_use"
-
         # Text block + tool use block
-        text_block = Mock()
-        text_block.type = "text"
-        text_block.text = "Let me search for that..."
+        text_block = make_text_block("Let me search for that...")
 
-        tool_block = Mock()
-        tool_block.type = "tool_use"
-        tool_block.id = "call_456"
-        tool_block.name = "search_course_content"
-        tool_block.input = {"query": "test"}
+        tool_block = make_tool_block(id="call_456", name="search_course_content", input={"query": "test"})
 
-        tool_use_response.content = [text_block, tool_block]
+        tool_use_response = make_response("tool_use", [text_block, tool_block])
 
         # Mock tool execution
         mock_tool_manager.execute_tool = Mock(return_value="Search result")
 
         # Final response
-        final_response = Mock()
-        final_text = Mock()
-        final_text.text = "Here's what I found"
-        final_response.content = [final_text]
+        final_response = make_final("Here's what I found")
 
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[tool_use_response, final_response]
-        )
+        mock_anthropic_client.messages.create = sequence_create(tool_use_response, final_response)
 
-        result = generator.generate_response(
+        result = await generator.generate_response(
             query="test",
-            tools=mock_tool_manager.get_tool_definitions(),
+            tools=SEARCH_TOOL_DEFS,
             tool_manager=mock_tool_manager
         )
 
@@ -169,87 +252,111 @@ class TestAIGeneratorToolExecution:
         # Verify final response returned
         assert result == "Here's what I found"
 
-    def test_ai_generator_passes_tools_parameter_correctly(self, mock_anthropic_client):
-        """Verify AIGenerator includes tools parameter in API call"""
+    async def test_ai_generator_executes_parallel_tool_calls_in_order(self, generator, mock_anthropic_client, mock_tool_manager):
+        """Verify multiple tool_use blocks in one response all run and keep block order"""
+
+        outline_block = make_tool_block(id="call_outline", name="get_course_outline", input={"course_name": "MCP"})
 
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
+        search_block = make_tool_block(id="call_search", name="search_course_content", input={"query": "tools"})
 
-        direct_response = Mock()
-        direct_response.stop_reason = "end_turn"
-        direct_text = Mock()
-        direct_text.text = "Response"
-        direct_response.content = [direct_text]
+        tool_use_response = make_response("tool_use", [outline_block, search_block])
 
-        mock_anthropic_client.messages.create = Mock(return_value=direct_response)
+        mock_tool_manager.execute_tool = Mock(
+            side_effect=lambda name, **kwargs: f"{name} result"
+        )
 
-        tools = [{"name": "search_course_content", "description": "Search courses"}]
-        generator.generate_response(query="test", tools=tools)
+        final_response = make_final("Combined answer")
 
-        # Verify tools parameter was passed
-        call_args = mock_anthropic_client.messages.create.call_args
-        assert call_args.kwargs['tools'] == tools
-        assert call_args.kwargs['tool_choice'] == {"type": "auto"}
+        mock_anthropic_client.messages.create = AsyncMock(
+            side_effect=[tool_use_response, final_response]
+        )
 
-    def test_ai_generator_temperature_and_tokens_config(self, mock_anthropic_client):
-        """Verify AIGenerator uses correct temperature and max_tokens"""
+        result = await generator.generate_response(
+            query="test",
+            tools=SEARCH_TOOL_DEFS,
+            tool_manager=mock_tool_manager
+        )
+
+        assert mock_tool_manager.execute_tool.call_count == 2
 
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
+        # Tool results follow the order of the tool_use blocks
+        tool_results = mock_anthropic_client.messages.create.call_args_list[1].kwargs['messages'][2]['content']
+        assert [r['tool_use_id'] for r in tool_results] == ["call_outline", "call_search"]
+        assert [r['content'] for r in tool_results] == [
+            "get_course_outline result",
+            "search_course_content result"
+        ]
 
-        direct_response = Mock()
-        direct_response.stop_reason = "end_turn"
-        direct_text = Mock()
-        direct_text.text = "Response"
-        direct_response.content = [direct_text]
+        assert result == "Combined answer"
 
-        mock_anthropic_client.messages.create = Mock(return_value=direct_response)
+    async def test_same_tool_blocks_run_in_block_order(self, generator, mock_vector_store):
+        """Verify same-tool blocks finishing at different speeds leave the last block's sources"""
 
-        generator.generate_response(query="test")
+        def search(query, course_name=None, lesson_number=None, limit=None):
+            # The first block's search is slow; run concurrently it would finish last
+            if query == "slow":
+                time.sleep(0.05)
+            return SearchResults([f"{query} content"], [{"course_title": f"{query} course"}], [0.1])
+
+        mock_vector_store.search = search
+        tool_manager = ToolManager()
+        tool_manager.register_tool(CourseSearchTool(mock_vector_store))
+
+        tool_use_response = make_response("tool_use", [
+            make_tool_block(id="call_1", name="search_course_content", input={"query": "slow"}),
+            make_tool_block(id="call_2", name="search_course_content", input={"query": "fast"})
+        ])
+
+        tool_results = await generator._execute_tools_async(tool_use_response, tool_manager)
+
+        assert [r['tool_use_id'] for r in tool_results] == ["call_1", "call_2"]
+        assert [r['content'] for r in tool_results] == ["[slow course]\nslow content", "[fast course]\nfast content"]
+        assert tool_manager.get_last_sources() == ["fast course"]
+
+    @pytest.mark.parametrize("query", [
+        "test",
+        "What is the outline of the MCP course?",
+        "Explain how retrieval works",
+    ])
+    async def test_ai_generator_caches_system_prompt(self, generator, mock_anthropic_client, direct_response_mock,
+                                                     query):
+        """Verify every query gets the same static system prompt as a single cached block"""
+
+        mock_anthropic_client.messages.create = AsyncMock(return_value=direct_response_mock)
+
+        await generator.generate_response(query=query)
 
-        # Verify temperature and max_tokens
         call_args = mock_anthropic_client.messages.create.call_args
-        assert call_args.kwargs['temperature'] == 0
-        assert call_args.kwargs['max_tokens'] == 800
-        assert call_args.kwargs['model'] == "test-model"
+        assert call_args.kwargs['system'] == [{
+            "type": "text",
+            "text": AIGenerator.SYSTEM_PROMPT,
+            "cache_control": {"type": "ephemeral"}
+        }]
 
 
+@pytest.mark.xdist_group("ai_generator")
 class TestAIGeneratorToolResultHandling:
     """Test cases for how AIGenerator handles different tool result scenarios"""
 
-    def test_ai_generator_second_call_includes_tools(self, mock_anthropic_client, mock_tool_manager):
+    async def test_ai_generator_second_call_includes_tools(self, generator, mock_anthropic_client, mock_tool_manager):
         """Verify second API call (after tool execution) DOES include tools parameter for multi-round support"""
 
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
         # First call with tool use
-        tool_use_response = Mock()
-        tool_use_response.stop_reason = "tool_use"
-
-        tool_block = Mock()
-        tool_block.type = "tool_use"
-        tool_block.id = "call_789"
-        tool_block.name = "search_course_content"
-        tool_block.input = {"query": "test"}
+        tool_block = make_tool_block(id="call_789", name="search_course_content", input={"query": "test"})
 
-        tool_use_response.content = [tool_block]
+        tool_use_response = make_response("tool_use", [tool_block])
 
         # Mock tool execution
         mock_tool_manager.execute_tool = Mock(return_value="Tool result")
 
         # Second call response (end turn - no more tool use)
-        final_response = Mock()
-        final_response.stop_reason = "end_turn"
-        final_text = Mock()
-        final_text.text = "Final answer"
-        final_response.content = [final_text]
+        final_response = make_final("Final answer")
 
-        mock_anthropic_client.messages.create = Mock(
+        mock_anthropic_client.messages.create = AsyncMock(
             side_effect=[tool_use_response, final_response]
         )
 
-        generator.generate_response(
+        await generator.generate_response(
             query="test",
             tools=[{"name": "search_course_content"}],
             tool_manager=mock_tool_manager
@@ -258,40 +365,29 @@ class TestAIGeneratorToolResultHandling:
         # Verify second call DOES include tools parameter (to allow for multi-round tool use)
         second_call_args = mock_anthropic_client.messages.create.call_args_list[1]
         assert 'tools' in second_call_args.kwargs
-        assert second_call_args.kwargs['tools'] == [{"name": "search_course_content"}]
+        assert second_call_args.kwargs['tools'] == [
+            {"name": "search_course_content", "cache_control": {"type": "ephemeral"}}
+        ]
 
-    def test_ai_generator_builds_message_history_correctly(self, mock_anthropic_client, mock_tool_manager):
+    async def test_ai_generator_builds_message_history_correctly(self, generator, mock_anthropic_client, mock_tool_manager):
         """Verify AIGenerator builds correct message history for tool execution"""
 
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
         # First call with tool use
-        tool_use_response = Mock()
-        tool_use_response.stop_reason = "tool_use"
-
-        tool_block = Mock()
-        tool_block.type = "tool_use"
-        tool_block.id = "call_abc"
-        tool_block.name = "search_course_content"
-        tool_block.input = {"query": "test"}
+        tool_block = make_tool_block(id="call_abc", name="search_course_content", input={"query": "test"})
 
-        tool_use_response.content = [tool_block]
+        tool_use_response = make_response("tool_use", [tool_block])
 
         # Mock tool execution
         mock_tool_manager.execute_tool = Mock(return_value="Tool result text")
 
         # Second call response
-        final_response = Mock()
-        final_text = Mock()
-        final_text.text = "Final answer"
-        final_response.content = [final_text]
+        final_response = make_final("Final answer")
 
-        mock_anthropic_client.messages.create = Mock(
+        mock_anthropic_client.messages.create = AsyncMock(
             side_effect=[tool_use_response, final_response]
         )
 
-        generator.generate_response(
+        await generator.generate_response(
             query="What is in the course?",
             tools=[{"name": "search_course_content"}],
             tool_manager=mock_tool_manager
@@ -313,373 +409,299 @@ class TestAIGeneratorToolResultHandling:
         # Third message: user providing tool results
         assert messages[2]['role'] == 'user'
 
+    def test_extract_response_text_skips_blocks_without_text(self, generator):
+        """Verify text is found past leading non-text blocks and missing text yields ''"""
 
-class TestAIGeneratorMultiRoundToolExecution:
-    """Test cases for 2-round sequential tool calling"""
+        tool_block = make_tool_block(id="call_1", name="search_course_content", input={})
+        text_block = make_text_block("Answer after tool block")
 
-    def test_two_rounds_of_tool_execution(self, mock_anthropic_client, mock_tool_manager):
-        """Verify two sequential rounds of tool execution"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
-        # Round 1: Tool use response
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
-
-        tool_block_1 = Mock()
-        tool_block_1.type = "tool_use"
-        tool_block_1.id = "call_1"
-        tool_block_1.name = "get_course_outline"
-        tool_block_1.input = {"course_name": "MCP"}
-
-        round1_response.content = [tool_block_1]
-
-        # Round 2: Another tool use response
-        round2_response = Mock()
-        round2_response.stop_reason = "tool_use"
-
-        tool_block_2 = Mock()
-        tool_block_2.type = "tool_use"
-        tool_block_2.id = "call_2"
-        tool_block_2.name = "search_course_content"
-        tool_block_2.input = {"query": "lesson 2"}
-
-        round2_response.content = [tool_block_2]
-
-        # Final response (no tool use)
-        final_response = Mock()
-        final_response.stop_reason = "end_turn"
-        final_text = Mock()
-        final_text.text = "Lesson 1 covers basic and advanced concepts..."
-        final_response.content = [final_text]
-
-        # Setup mock to return responses in sequence
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[round1_response, round2_response, final_response]
-        )
+        assert generator._extract_response_text(
+            SimpleNamespace(content=[tool_block, text_block])
+        ) == "Answer after tool block"
+        assert generator._extract_response_text(SimpleNamespace(content=[tool_block])) == ""
+        assert generator._extract_response_text(SimpleNamespace(content=[])) == ""
 
-        # Setup tool manager
-        mock_tool_manager.execute_tool = Mock(
-            side_effect=["Course outline...", "Lesson 2 content..."]
-        )
 
-        # Execute
-        result = generator.generate_response(
+@pytest.mark.xdist_group("ai_generator")
+class TestAIGeneratorMultiRoundToolExecution:
+    """Test cases for 2-round sequential tool calling"""
+
+    @pytest.mark.parametrize("responses,tool_results,api_calls,tool_inputs,final_tool_choice,expected", [
+        pytest.param(
+            [
+                make_response("tool_use", [make_tool_block(id="call_1", name="get_course_outline", input={"course_name": "MCP"})]),
+                make_response("tool_use", [make_tool_block(id="call_2", name="search_course_content", input={"query": "lesson 2"})]),
+                make_final("Lesson 1 covers basic and advanced concepts...")
+            ],
+            ["Course outline...", "Lesson 2 content..."],
+            3, [{"course_name": "MCP"}, {"query": "lesson 2"}],
+            # Max rounds reached: the last call keeps the tools but forbids using them
+            {"type": "none"},
+            "Lesson 1 covers basic and advanced concepts...",
+            id="two_rounds_then_final"
+        ),
+        pytest.param(
+            [
+                make_response("tool_use", [make_tool_block(id="call_1", name="search_course_content", input={"query": "lesson details"})]),
+                make_final("Based on the search, here's the answer...")
+            ],
+            ["Search results..."],
+            2, [{"query": "lesson details"}],
+            {"type": "auto"},
+            "Based on the search, here's the answer...",
+            id="stop_after_first_round_end_turn"
+        ),
+        pytest.param(
+            [
+                make_response("tool_use", [
+                    make_text_block("Let me search for that..."),
+                    make_tool_block(id="call_1", name="search_course_content", input={"query": "test"})
+                ])
+            ],
+            Exception("Database connection failed"),
+            # The failed tool stops the loop; the first round's text is the answer
+            1, [{"query": "test"}],
+            {"type": "auto"},
+            "Let me search for that...",
+            id="tool_error_stops_loop"
+        ),
+    ])
+    async def test_multi_round(self, generator, mock_anthropic_client, mock_tool_manager,
+                               responses, tool_results, api_calls, tool_inputs, final_tool_choice, expected):
+        """Verify the tool loop's API calls, tool executions and answer for each scenario"""
+        mock_anthropic_client.messages.create = AsyncMock(side_effect=responses)
+        mock_tool_manager.execute_tool = Mock(side_effect=tool_results)
+
+        result = await generator.generate_response(
             query="What's in lesson 2 of MCP course?",
-            tools=[{"name": "get_course_outline"}, {"name": "search_course_content"}],
-            tool_manager=mock_tool_manager
+            tools=SEARCH_TOOL_DEFS,
+            tool_manager=mock_tool_manager,
+            max_tool_rounds=2
         )
 
-        # Assertions:
-        # 1. Three API calls made (Round 1, Round 2, Final)
-        assert mock_anthropic_client.messages.create.call_count == 3
-
-        # 2. Two tool executions
-        assert mock_tool_manager.execute_tool.call_count == 2
-
-        # 3. Correct tool names called
-        calls = mock_tool_manager.execute_tool.call_args_list
-        assert calls[0].kwargs.get("course_name") == "MCP"  # First tool: get_course_outline
-        assert calls[1].kwargs.get("query") == "lesson 2"  # Second tool: search_course_content
-
-        # 4. Message history built correctly
-        # Check second API call has 3 messages (user, assistant, tool_result)
-        second_call_messages = mock_anthropic_client.messages.create.call_args_list[1].kwargs['messages']
-        assert len(second_call_messages) == 3
+        calls = mock_anthropic_client.messages.create.call_args_list
+        assert len(calls) == api_calls
+        assert [c.kwargs for c in mock_tool_manager.execute_tool.call_args_list] == tool_inputs
+        assert "tools" in calls[-1].kwargs
+        assert calls[-1].kwargs['tool_choice'] == final_tool_choice
+        assert result == expected
 
-        # Check third API call has 5 messages (user, asst, tool_result, asst, tool_result)
-        third_call_messages = mock_anthropic_client.messages.create.call_args_list[2].kwargs['messages']
-        assert len(third_call_messages) == 5
+    async def test_max_rounds_preamble_text_does_not_replace_final_call(self, generator, mock_anthropic_client, mock_tool_manager):
+        """Verify text alongside the last round's tool_use is not returned as the answer"""
+        preamble = make_text_block("Let me look that up...")
 
-        # 5. Final response returned
-        assert result == "Lesson 1 covers basic and advanced concepts..."
+        tool_block = make_tool_block(id="call_1", name="search_course_content", input={"query": "test"})
 
-    def test_stop_after_first_round_end_turn(self, mock_anthropic_client, mock_tool_manager):
-        """Verify loop stops after first round if no tool use in response"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
+        tool_use_response = make_response("tool_use", [preamble, tool_block])
 
-        # Round 1: Tool use
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
+        final_response = make_final("Synthesized answer")
 
-        tool_block = Mock()
-        tool_block.type = "tool_use"
-        tool_block.id = "call_1"
-        tool_block.name = "search_course_content"
-        tool_block.input = {"query": "lesson details"}
+        mock_anthropic_client.messages.create = sequence_create(tool_use_response, final_response)
+        mock_tool_manager.execute_tool = Mock(return_value="Result")
 
-        round1_response.content = [tool_block]
+        result = await generator.generate_response(
+            query="test",
+            tools=[{"name": "search_course_content"}],
+            tool_manager=mock_tool_manager,
+            max_tool_rounds=1
+        )
 
-        # Round 2: end_turn (no tool use)
-        round2_response = Mock()
-        round2_response.stop_reason = "end_turn"
+        assert mock_anthropic_client.messages.create.call_count == 2
+        assert result == "Synthesized answer"
 
-        text_block = Mock()
-        text_block.text = "Based on the search, here's the answer..."
-        round2_response.content = [text_block]
+    async def test_message_history_accumulates_correctly(self, generator, mock_anthropic_client, mock_tool_manager):
+        """Verify message history grows correctly across rounds"""
+        sent_messages = []
+        mock_anthropic_client.messages.create = snapshot_messages_create([
+            make_response("tool_use", [make_tool_block(id="call_1", name="search_course_content", input={"query": "test1"})]),
+            make_response("tool_use", [make_tool_block(id="call_2", name="search_course_content", input={"query": "test2"})]),
+            make_final("Final answer")
+        ], sent_messages)
 
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[round1_response, round2_response]
+        mock_tool_manager.execute_tool = Mock(
+            side_effect=["Result 1", "Result 2"]
         )
 
-        mock_tool_manager.execute_tool = Mock(return_value="Search results...")
-
         # Execute
-        result = generator.generate_response(
+        await generator.generate_response(
             query="Test question",
             tools=[{"name": "search_course_content"}],
             tool_manager=mock_tool_manager
         )
 
-        # Assertions:
-        # 1. Two API calls (Round 1 + Round 2 final)
-        assert mock_anthropic_client.messages.create.call_count == 2
-
-        # 2. One tool execution
-        assert mock_tool_manager.execute_tool.call_count == 1
-
-        # 3. Correct final response
-        assert result == "Based on the search, here's the answer..."
-
-    def test_max_rounds_limit_enforced(self, mock_anthropic_client, mock_tool_manager):
-        """Verify max_rounds=2 limit is enforced"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
-        # Round 1: Tool use
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
-
-        tool_block_1 = Mock()
-        tool_block_1.type = "tool_use"
-        tool_block_1.id = "call_1"
-        tool_block_1.name = "search_course_content"
-        tool_block_1.input = {"query": "basic"}
-
-        round1_response.content = [tool_block_1]
+        # Roles sent at each call: query, then an assistant/tool_result pair per round
+        assert [[m['role'] for m in messages] for messages in sent_messages] == [
+            ["user"],
+            ["user", "assistant", "user"],
+            ["user", "assistant", "user", "assistant", "user"]
+        ]
 
-        # Round 2: Tool use again (would continue but we're at limit)
-        round2_response = Mock()
-        round2_response.stop_reason = "tool_use"
-
-        tool_block_2 = Mock()
-        tool_block_2.type = "tool_use"
-        tool_block_2.id = "call_2"
-        tool_block_2.name = "search_course_content"
-        tool_block_2.input = {"query": "advanced"}
-
-        round2_response.content = [tool_block_2]
-
-        # Final response (made without tools after max rounds)
-        final_response = Mock()
-        final_response.stop_reason = "end_turn"
+    async def test_tools_parameter_included_in_all_rounds(self, generator, mock_anthropic_client, mock_tool_manager):
+        """Verify tools are available in both Round 1 and Round 2"""
+        tool_block_1 = make_tool_block(id="call_1", name="search_course_content", input={"query": "test"})
+        round1_response = make_response("tool_use", [tool_block_1])
 
-        final_text = Mock()
-        final_text.text = "Here's my synthesis of the information..."
-        final_response.content = [final_text]
+        round2_response = make_final("Answer")
 
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[round1_response, round2_response, final_response]
+        mock_anthropic_client.messages.create = AsyncMock(
+            side_effect=[round1_response, round2_response]
         )
 
-        mock_tool_manager.execute_tool = Mock(
-            side_effect=["Result 1", "Result 2"]
-        )
+        mock_tool_manager.execute_tool = Mock(return_value="Result")
 
-        # Execute
-        result = generator.generate_response(
+        tools = [{"name": "search_course_content"}]
+        await generator.generate_response(
             query="test",
-            tools=[{"name": "search_course_content"}],
-            tool_manager=mock_tool_manager,
-            max_tool_rounds=2
+            tools=tools,
+            tool_manager=mock_tool_manager
         )
 
-        # Assertions:
-        # 1. Three API calls (Round 1, Round 2, Final without tools)
-        assert mock_anthropic_client.messages.create.call_count == 3
+        # Both Round 1 and Round 2 should have tools parameter
+        for i in range(2):
+            call_kwargs = mock_anthropic_client.messages.create.call_args_list[i].kwargs
+            assert 'tools' in call_kwargs
+            assert call_kwargs['tool_choice'] == {"type": "auto"}
 
-        # 2. Two tool executions (one per round)
-        assert mock_tool_manager.execute_tool.call_count == 2
 
-        # 3. Final call should NOT have tools parameter
-        final_call_args = mock_anthropic_client.messages.create.call_args_list[2]
-        assert 'tools' not in final_call_args.kwargs
+class FakeMessageStream:
+    """Stand-in for the async context manager returned by client.messages.stream()"""
 
-        # 4. Response returned
-        assert result == "Here's my synthesis of the information..."
+    def __init__(self, texts, final_message):
+        self.final_message = final_message
+        self.text_stream = self._iter_texts(texts)
 
-    def test_tool_execution_error_stops_loop(self, mock_anthropic_client, mock_tool_manager):
-        """Verify tool execution error prevents further rounds"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
+    async def _iter_texts(self, texts):
+        for text in texts:
+            yield text
 
-        # Round 1: Tool use
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
+    async def __aenter__(self):
+        return self
 
-        tool_block = Mock()
-        tool_block.type = "tool_use"
-        tool_block.id = "call_1"
-        tool_block.name = "search_course_content"
-        tool_block.input = {"query": "test"}
+    async def __aexit__(self, *exc_info):
+        return False
 
-        # Add text content so _extract_response_text works
-        text_block = Mock()
-        text_block.text = "Let me search for that..."
+    async def get_final_message(self):
+        return self.final_message
 
-        round1_response.content = [text_block, tool_block]
 
-        mock_anthropic_client.messages.create = Mock(return_value=round1_response)
+@pytest.mark.xdist_group("ai_generator")
+class TestAIGeneratorStreaming:
+    """Test cases for streamed response generation"""
 
-        # Tool execution raises exception
-        mock_tool_manager.execute_tool = Mock(
-            side_effect=Exception("Database connection failed")
-        )
+    async def test_stream_yields_text_deltas(self, generator, mock_anthropic_client):
+        """Verify text deltas are yielded in order for a direct response"""
+        final_message = make_response("end_turn", [])
 
-        # Execute
-        result = generator.generate_response(
-            query="test",
-            tools=[{"name": "search_course_content"}],
-            tool_manager=mock_tool_manager
+        mock_anthropic_client.messages.stream = Mock(
+            return_value=FakeMessageStream(["Hello", ", ", "world"], final_message)
         )
 
-        # Assertions:
-        # 1. Only one API call (error stops the loop)
-        assert mock_anthropic_client.messages.create.call_count == 1
+        events = [event async for event in generator.generate_response_stream(query="Hi")]
+
+        assert events == [{"type": "text", "text": text} for text in ["Hello", ", ", "world"]]
+        assert mock_anthropic_client.messages.stream.call_count == 1
+
+    async def test_stream_runs_tool_rounds_then_final_with_tool_choice_none(self, generator, mock_anthropic_client, mock_tool_manager):
+        """Verify tool use mid-stream re-enters the loop and the last round keeps tools with tool_choice none"""
+        tool_block = make_tool_block(id="call_1", name="search_course_content", input={"query": "lesson 1"})
+
+        tool_use_message = make_response("tool_use", [tool_block])
+
+        final_message = make_response("end_turn", [])
+
+        mock_anthropic_client.messages.stream = Mock(side_effect=[
+            FakeMessageStream(["Let me search."], tool_use_message),
+            FakeMessageStream([], tool_use_message),
+            FakeMessageStream(["Lesson 1 ", "covers MCP."], final_message)
+        ])
+        mock_tool_manager.execute_tool = Mock(return_value="Lesson 1 content")
+
+        events = [
+            event async for event in generator.generate_response_stream(
+                query="What is in lesson 1?",
+                tools=[{"name": "search_course_content"}],
+                tool_manager=mock_tool_manager
+            )
+        ]
+
+        # Each tool round is closed by a marker, so its preamble is distinguishable
+        assert events == [
+            {"type": "text", "text": "Let me search."},
+            {"type": "tool_round_end"},
+            {"type": "tool_round_end"},
+            {"type": "text", "text": "Lesson 1 "},
+            {"type": "text", "text": "covers MCP."}
+        ]
+        assert mock_tool_manager.execute_tool.call_count == 2
 
-        # 2. Tool execution was attempted
-        assert mock_tool_manager.execute_tool.call_count == 1
+        calls = mock_anthropic_client.messages.stream.call_args_list
+        assert len(calls) == 3
+        assert calls[1].kwargs['tool_choice'] == {"type": "auto"}
+        assert calls[2].kwargs['tool_choice'] == {"type": "none"}
+        assert len(calls[2].kwargs['messages']) == 5
 
-        # 3. Response is from the first round (extracted text)
-        assert result == "Let me search for that..."
 
-    def test_no_tool_use_direct_response(self, mock_anthropic_client):
-        """Verify direct response when Claude doesn't use tools"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
+class FakeAsyncResults:
+    """Async iterable standing in for the batch results decoder"""
 
-        direct_response = Mock()
-        direct_response.stop_reason = "end_turn"
+    def __init__(self, entries):
+        self.entries = entries
 
-        text_block = Mock()
-        text_block.text = "I can answer that directly..."
-        direct_response.content = [text_block]
+    def __aiter__(self):
+        return self._iter()
 
-        mock_anthropic_client.messages.create = Mock(return_value=direct_response)
+    async def _iter(self):
+        for entry in self.entries:
+            yield entry
 
-        result = generator.generate_response(
-            query="Simple question",
-            tools=[{"name": "search_course_content"}],
-            tool_manager=Mock()
-        )
 
-        # Assertions:
-        # 1. Single API call
-        assert mock_anthropic_client.messages.create.call_count == 1
+@pytest.mark.xdist_group("ai_generator")
+class TestAIGeneratorBatch:
+    """Test cases for batched response generation"""
 
-        # 2. Response returned
-        assert result == "I can answer that directly..."
+    async def test_batch_polls_until_ended_and_keeps_query_order(self, generator, mock_anthropic_client):
+        """Verify batch results are mapped back to their queries by custom_id"""
+        batches = mock_anthropic_client.messages.batches
+        batches.create = AsyncMock(return_value=SimpleNamespace(id="batch_1", processing_status="in_progress"))
+        batches.retrieve = AsyncMock(return_value=SimpleNamespace(id="batch_1", processing_status="ended"))
 
-    def test_message_history_accumulates_correctly(self, mock_anthropic_client, mock_tool_manager):
-        """Verify message history grows correctly across rounds"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
-        # Setup same as test_two_rounds_of_tool_execution
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
-        tool_block_1 = Mock()
-        tool_block_1.type = "tool_use"
-        tool_block_1.id = "call_1"
-        tool_block_1.name = "search_course_content"
-        tool_block_1.input = {"query": "test1"}
-        round1_response.content = [tool_block_1]
-
-        round2_response = Mock()
-        round2_response.stop_reason = "tool_use"
-        tool_block_2 = Mock()
-        tool_block_2.type = "tool_use"
-        tool_block_2.id = "call_2"
-        tool_block_2.name = "search_course_content"
-        tool_block_2.input = {"query": "test2"}
-        round2_response.content = [tool_block_2]
-
-        final_response = Mock()
-        final_response.stop_reason = "end_turn"
-        final_text = Mock()
-        final_text.text = "Final answer"
-        final_response.content = [final_text]
-
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[round1_response, round2_response, final_response]
-        )
+        def succeeded(custom_id, text):
+            message = SimpleNamespace(content=[SimpleNamespace(type="text", text=text)])
+            return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="succeeded", message=message))
 
-        mock_tool_manager.execute_tool = Mock(
-            side_effect=["Result 1", "Result 2"]
-        )
+        # Results arrive out of order, and one entry errored
+        batches.results = AsyncMock(return_value=FakeAsyncResults([
+            succeeded("query-2", "Third"),
+            succeeded("query-0", "First"),
+            SimpleNamespace(custom_id="query-1", result=SimpleNamespace(type="errored")),
+        ]))
 
-        # Execute
-        generator.generate_response(
-            query="Test question",
-            tools=[{"name": "search_course_content"}],
-            tool_manager=mock_tool_manager
+        responses = await generator.generate_responses_batch(
+            ["Q1", "Q2", "Q3"],
+            poll_interval=0
         )
 
-        # Check message counts at each call
-        first_call_msgs = mock_anthropic_client.messages.create.call_args_list[0].kwargs['messages']
-        assert len(first_call_msgs) == 1
-        assert first_call_msgs[0]['role'] == 'user'
-
-        second_call_msgs = mock_anthropic_client.messages.create.call_args_list[1].kwargs['messages']
-        assert len(second_call_msgs) == 3
-        assert second_call_msgs[0]['role'] == 'user'
-        assert second_call_msgs[1]['role'] == 'assistant'
-        assert second_call_msgs[2]['role'] == 'user'
-
-        third_call_msgs = mock_anthropic_client.messages.create.call_args_list[2].kwargs['messages']
-        assert len(third_call_msgs) == 5
-        assert third_call_msgs[0]['role'] == 'user'
-        assert third_call_msgs[1]['role'] == 'assistant'
-        assert third_call_msgs[2]['role'] == 'user'
-        assert third_call_msgs[3]['role'] == 'assistant'
-        assert third_call_msgs[4]['role'] == 'user'
-
-    def test_tools_parameter_included_in_all_rounds(self, mock_anthropic_client, mock_tool_manager):
-        """Verify tools are available in both Round 1 and Round 2"""
-        generator = AIGenerator(api_key="test-key", model="test-model")
-        generator.client = mock_anthropic_client
-
-        round1_response = Mock()
-        round1_response.stop_reason = "tool_use"
-        tool_block_1 = Mock()
-        tool_block_1.type = "tool_use"
-        tool_block_1.id = "call_1"
-        tool_block_1.name = "search_course_content"
-        tool_block_1.input = {"query": "test"}
-        round1_response.content = [tool_block_1]
-
-        round2_response = Mock()
-        round2_response.stop_reason = "end_turn"
-        text_block = Mock()
-        text_block.text = "Answer"
-        round2_response.content = [text_block]
-
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[round1_response, round2_response]
-        )
+        assert responses == ["First", "", "Third"]
+        batches.retrieve.assert_awaited_once_with("batch_1")
 
-        mock_tool_manager.execute_tool = Mock(return_value="Result")
+        requests = batches.create.call_args.kwargs['requests']
+        assert [r['custom_id'] for r in requests] == ["query-0", "query-1", "query-2"]
+        assert requests[0]['params']['messages'] == [{"role": "user", "content": "Q1"}]
+        assert requests[0]['params']['system'][0]['cache_control'] == {"type": "ephemeral"}
 
-        tools = [{"name": "search_course_content"}]
-        generator.generate_response(
-            query="test",
-            tools=tools,
+    async def test_batch_with_tools_falls_back_to_concurrent_calls(self, generator, mock_anthropic_client, mock_tool_manager):
+        """Verify tool-enabled batches run per-query tool loops instead of the batch API"""
+        direct_response = make_final("Answer")
+
+        mock_anthropic_client.messages.create = AsyncMock(return_value=direct_response)
+        mock_anthropic_client.messages.batches.create = AsyncMock()
+
+        responses = await generator.generate_responses_batch(
+            ["Q1", "Q2"],
+            tools=SEARCH_TOOL_DEFS,
             tool_manager=mock_tool_manager
         )
 
-        # Both Round 1 and Round 2 should have tools parameter
-        for i in range(2):
-            call_kwargs = mock_anthropic_client.messages.create.call_args_list[i].kwargs
-            assert 'tools' in call_kwargs
-            assert call_kwargs['tool_choice'] == {"type": "auto"}
+        assert responses == ["Answer", "Answer"]
+        assert mock_anthropic_client.messages.create.await_count == 2
+        mock_anthropic_client.messages.batches.create.assert_not_called()
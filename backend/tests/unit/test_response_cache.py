@@ -0,0 +1,136 @@
+"""Unit tests for SemanticResponseCache"""
+
+import pytest
+from unittest.mock import Mock, patch
+
+from response_cache import SemanticResponseCache
+
+
+# Fixed embeddings so similarity is predictable
+EMBEDDINGS = {
+    "what is mcp?": [1.0, 0.0, 0.0],
+    "what's mcp?": [0.99, 0.1, 0.0],
+    "who teaches the course?": [0.0, 1.0, 0.0],
+    # Near-identical embeddings for queries that differ only in specifics
+    "what is in lesson 1 of mcp?": [0.0, 0.0, 1.0],
+    "what is in lesson 2 of mcp?": [0.0, 0.01, 1.0],
+    "what is in lesson 1 of chroma?": [0.01, 0.0, 1.0],
+    "mcp lesson 1 summary": [0.5, 0.5, 0.0],
+    "mcp lesson 1 summary please": [0.5, 0.49, 0.0],
+    "chroma lesson 1 summary": [0.5, 0.51, 0.0],
+    "mcp lesson 2 summary": [0.49, 0.5, 0.0],
+}
+
+
+@pytest.fixture
+def embed_fn():
+    """Embedding function backed by the fixed EMBEDDINGS table"""
+    return Mock(side_effect=lambda texts: [EMBEDDINGS[text] for text in texts])
+
+
+class TestSemanticResponseCache:
+    """Test cases for SemanticResponseCache lookups and eviction"""
+
+    def test_exact_repeat_hits_without_embedding(self, embed_fn):
+        """Verify normalized exact repeats are served without re-embedding"""
+        cache = SemanticResponseCache(embed_fn)
+        cache.put("What is MCP?", "MCP is a protocol.", ["MCP Course"])
+        embed_fn.reset_mock()
+
+        assert cache.get("  what is   MCP? ") == ("MCP is a protocol.", ["MCP Course"])
+        embed_fn.assert_not_called()
+
+    def test_similar_query_hits_above_threshold(self, embed_fn):
+        """Verify a paraphrase above the similarity threshold reuses the answer"""
+        cache = SemanticResponseCache(embed_fn, threshold=0.9)
+        cache.put("What is MCP?", "MCP is a protocol.", [])
+
+        assert cache.get("What's MCP?") == ("MCP is a protocol.", [])
+
+    def test_dissimilar_query_misses(self, embed_fn):
+        """Verify an unrelated query is a miss"""
+        cache = SemanticResponseCache(embed_fn, threshold=0.9)
+        cache.put("What is MCP?", "MCP is a protocol.", [])
+
+        assert cache.get("Who teaches the course?") is None
+
+    @pytest.mark.parametrize("query", [
+        "What is in lesson 2 of MCP?",
+        "What is in lesson 1 of Chroma?",
+    ], ids=["other_lesson", "other_course"])
+    def test_similar_query_with_other_specifics_misses(self, embed_fn, query):
+        """Verify a query naming another lesson or course never reuses the answer"""
+        cache = SemanticResponseCache(embed_fn, threshold=0.9)
+        cache.put("What is in lesson 1 of MCP?", "Lesson 1 covers setup.", ["MCP - Lesson 1"])
+
+        assert cache.get(query) is None
+
+    @pytest.mark.parametrize("query,expected", [
+        ("MCP lesson 1 summary please", ("Lesson 1 is setup.", [])),
+        ("Chroma lesson 1 summary", None),
+        ("MCP lesson 2 summary", None),
+    ], ids=["same_leading_course", "other_leading_course", "other_lesson_number"])
+    def test_leading_course_name_counts_as_specific(self, embed_fn, query, expected):
+        """Verify a course name at the start of a query still has to match"""
+        cache = SemanticResponseCache(embed_fn, threshold=0.9)
+        cache.put("MCP lesson 1 summary", "Lesson 1 is setup.", [])
+
+        assert cache.get(query) == expected
+
+    def test_embedding_buffer_is_reused_across_evictions(self, embed_fn):
+        """Verify puts past capacity overwrite rows in place rather than reallocating"""
+        cache = SemanticResponseCache(embed_fn, max_items=2)
+        cache.put("What is MCP?", "MCP is a protocol.", [])
+        matrix = cache._matrix
+
+        cache.put("Who teaches the course?", "Test Instructor.", [])
+        cache.put("What is in lesson 1 of MCP?", "Lesson 1 covers setup.", [])
+
+        assert cache._matrix is matrix
+        assert len(cache) == 2
+        assert cache.get("What is MCP?") is None
+        assert cache.get("What is in lesson 1 of MCP?") == ("Lesson 1 covers setup.", [])
+
+    def test_lookup_embedding_is_reused_by_put(self, embed_fn):
+        """Verify a miss followed by put embeds the query only once"""
+        cache = SemanticResponseCache(embed_fn, threshold=0.9)
+        cache.put("Who teaches the course?", "Test Instructor.", [])
+        embed_fn.reset_mock()
+
+        hit, embedding = cache.lookup("What is MCP?")
+        cache.put("What is MCP?", "MCP is a protocol.", [], embedding)
+
+        assert hit is None
+        embed_fn.assert_called_once_with(["what is mcp?"])
+        assert cache.get("What's MCP?") == ("MCP is a protocol.", [])
+
+    def test_expired_entries_are_evicted(self, embed_fn):
+        """Verify entries older than the TTL are dropped"""
+        cache = SemanticResponseCache(embed_fn, ttl=60)
+
+        with patch('response_cache.time.monotonic', return_value=1000.0):
+            cache.put("What is MCP?", "MCP is a protocol.", [])
+
+        with patch('response_cache.time.monotonic', return_value=1061.0):
+            assert cache.get("What is MCP?") is None
+
+        assert len(cache) == 0
+
+    def test_oldest_entry_evicted_at_capacity(self, embed_fn):
+        """Verify max_items evicts the oldest entry first"""
+        cache = SemanticResponseCache(embed_fn, max_items=1)
+        cache.put("What is MCP?", "MCP is a protocol.", [])
+        cache.put("Who teaches the course?", "Test Instructor.", [])
+
+        assert len(cache) == 1
+        assert cache.get("Who teaches the course?") == ("Test Instructor.", [])
+        assert cache.get("What is MCP?") is None
+
+    def test_returned_sources_are_copies(self, embed_fn):
+        """Verify callers cannot mutate cached sources"""
+        cache = SemanticResponseCache(embed_fn)
+        cache.put("What is MCP?", "MCP is a protocol.", ["MCP Course"])
+
+        cache.get("What is MCP?")[1].append("Injected")
+
+        assert cache.get("What is MCP?")[1] == ["MCP Course"]
@@ -1,30 +1,30 @@
 """Unit tests for VectorStore component"""
 
 import pytest
-from unittest.mock import Mock, patch, call
-import sys
-import os
-
-# Add parent directory to path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from unittest.mock import Mock, MagicMock
 
 from vector_store import VectorStore, SearchResults
 
+# ChromaDB-shaped query payloads, built once and only read by the tests
+_CHROMA_EMPTY = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+_CHROMA_TWO_DOC = {
+    "documents": [["doc1", "doc2"]],
+    "metadatas": [[{"key1": "val1"}, {"key2": "val2"}]],
+    "distances": [[0.1, 0.2]]
+}
+
 
+@pytest.mark.xdist_group("vector_store")
 class TestVectorStoreMaxResults:
     """Test cases for MAX_RESULTS configuration"""
 
-    def test_vector_store_respects_max_results_zero(self, mock_chroma_client):
+    def test_vector_store_respects_max_results_zero(self, vector_store, monkeypatch):
         """Verify VectorStore passes n_results=0 to ChromaDB when max_results=0"""
-        store = VectorStore(
-            chroma_path="./test_db",
-            embedding_model="test-model",
-            max_results=0
-        )
+        store = vector_store
+        monkeypatch.setattr(store, "max_results", 0)
 
         # Mock the course_content collection's query method
-        mock_results = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        store.course_content.query = Mock(return_value=mock_results)
+        store.course_content.query = Mock(return_value=_CHROMA_EMPTY)
 
         # Call search without limit parameter (should use configured max_results)
         results = store.search("test query")
@@ -39,13 +39,10 @@ class TestVectorStoreMaxResults:
         assert results.is_empty(), "SearchResults should be empty when n_results=0"
         assert len(results.documents) == 0
 
-    def test_vector_store_limit_override(self, mock_chroma_client):
+    def test_vector_store_limit_override(self, vector_store, monkeypatch):
         """Verify explicit limit parameter overrides MAX_RESULTS config"""
-        store = VectorStore(
-            chroma_path="./test_db",
-            embedding_model="test-model",
-            max_results=0
-        )
+        store = vector_store
+        monkeypatch.setattr(store, "max_results", 0)
 
         mock_results = {
             "documents": [["doc1"]],
@@ -61,56 +58,60 @@ class TestVectorStoreMaxResults:
         call_args = store.course_content.query.call_args
         assert call_args.kwargs['n_results'] == 5, "Explicit limit should override configured max_results"
 
-    @pytest.mark.parametrize("max_results_config", [0, 1, 3, 5, 10])
-    def test_vector_store_max_results_parameter(self, max_results_config, mock_chroma_client):
+    @pytest.mark.parametrize("max_results_config", [0, 1, 10])
+    def test_vector_store_max_results_parameter(self, max_results_config, vector_store, monkeypatch):
         """Parametrized test: Verify n_results matches configured MAX_RESULTS"""
-        store = VectorStore(
-            chroma_path="./test_db",
-            embedding_model="test-model",
-            max_results=max_results_config
-        )
+        store = vector_store
+        monkeypatch.setattr(store, "max_results", max_results_config)
 
-        mock_results = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        store.course_content.query = Mock(return_value=mock_results)
+        store.course_content.query = Mock(return_value=_CHROMA_EMPTY)
 
         store.search("test query")
 
         call_args = store.course_content.query.call_args
         assert call_args.kwargs['n_results'] == max_results_config
 
-    def test_vector_store_stores_max_results_value(self, mock_chroma_client):
+    def test_vector_store_stores_max_results_value(self, make_vector_store):
         """Verify VectorStore correctly stores max_results in instance variable"""
-        store_zero = VectorStore("./test_db", "test-model", max_results=0)
+        store_zero = make_vector_store(max_results=0)
         assert store_zero.max_results == 0
 
-        store_five = VectorStore("./test_db", "test-model", max_results=5)
+        store_five = make_vector_store(max_results=5)
         assert store_five.max_results == 5
 
+    def test_vector_store_keeps_falsy_injected_dependencies(self):
+        """Verify an injected client or embedding function is used even if it is falsy"""
+        client = MagicMock()
+        client.__len__.return_value = 0
+        embedding_function = MagicMock()
+        embedding_function.__bool__.return_value = False
+
+        store = VectorStore(
+            chroma_path="./test_db",
+            embedding_model="test-model",
+            client=client,
+            embedding_function=embedding_function
+        )
+
+        assert store.client is client
+        assert store.embedding_function is embedding_function
+
 
+@pytest.mark.xdist_group("vector_store")
 class TestSearchResults:
     """Test cases for SearchResults dataclass"""
 
-    def test_search_results_empty_detection(self):
+    @pytest.mark.parametrize("results,expected_empty", [
+        (SearchResults(documents=[], metadata=[], distances=[]), True),
+        (SearchResults(documents=["doc1"], metadata=[{"key": "value"}], distances=[0.1]), False),
+    ], ids=["empty", "non_empty"])
+    def test_search_results_empty_detection(self, results, expected_empty):
         """Verify SearchResults correctly identifies empty results"""
-        empty_results = SearchResults(documents=[], metadata=[], distances=[])
-        assert empty_results.is_empty(), "Empty results should be detected"
-
-        non_empty = SearchResults(
-            documents=["doc1"],
-            metadata=[{"key": "value"}],
-            distances=[0.1]
-        )
-        assert not non_empty.is_empty(), "Non-empty results should be detected"
+        assert results.is_empty() is expected_empty
 
     def test_search_results_from_chroma(self):
         """Test SearchResults.from_chroma() creation"""
-        chroma_results = {
-            "documents": [["doc1", "doc2"]],
-            "metadatas": [[{"key1": "val1"}, {"key2": "val2"}]],
-            "distances": [[0.1, 0.2]]
-        }
-
-        results = SearchResults.from_chroma(chroma_results)
+        results = SearchResults.from_chroma(_CHROMA_TWO_DOC)
 
         assert len(results.documents) == 2
         assert results.documents == ["doc1", "doc2"]
@@ -126,12 +127,13 @@ class TestSearchResults:
         assert len(results.documents) == 0
 
 
+@pytest.mark.xdist_group("vector_store")
 class TestVectorStoreSearchBehavior:
     """Test cases for search behavior with filters and course name resolution"""
 
-    def test_search_with_course_name_resolution(self, mock_chroma_client):
+    def test_search_with_course_name_resolution(self, vector_store):
         """Verify search resolves course name before searching content"""
-        store = VectorStore("./test_db", "test-model", max_results=5)
+        store = vector_store
 
         # Mock course catalog query (for name resolution)
         catalog_results = {
@@ -162,9 +164,9 @@ class TestVectorStoreSearchBehavior:
         content_call = store.course_content.query.call_args
         assert content_call.kwargs['where']['course_title'] == "MCP: Build Rich-Context AI Apps"
 
-    def test_search_with_nonexistent_course(self, mock_chroma_client):
+    def test_search_with_nonexistent_course(self, vector_store):
         """Verify search returns error when course name doesn't resolve"""
-        store = VectorStore("./test_db", "test-model", max_results=5)
+        store = vector_store
 
         # Mock empty catalog results
         store.course_catalog.query = Mock(return_value={
@@ -180,12 +182,11 @@ class TestVectorStoreSearchBehavior:
         assert "No course found" in results.error
         assert "NonexistentCourse" in results.error
 
-    def test_search_builds_correct_filter_for_lesson_number(self, mock_chroma_client):
+    def test_search_builds_correct_filter_for_lesson_number(self, vector_store):
         """Verify search builds correct filter when lesson_number is provided"""
-        store = VectorStore("./test_db", "test-model", max_results=5)
+        store = vector_store
 
-        mock_results = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        store.course_content.query = Mock(return_value=mock_results)
+        store.course_content.query = Mock(return_value=_CHROMA_EMPTY)
 
         # Search with lesson number only (no course name)
         store.search("test query", lesson_number=2)